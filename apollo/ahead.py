@@ -0,0 +1,271 @@
+# ahead.py
+# Render-ahead playback: worker processes prepare the frames of a file before they are due
+
+from __future__ import annotations
+
+import cv2
+import os
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from cv2 import VideoCapture
+from multiprocessing.shared_memory import SharedMemory
+from numpy.typing import NDArray
+from typing import Literal
+
+from .ansi import FrameEncoder, HalfBlockEncoder, HOME, RESET, ColorMode
+from .ascii import get_cells, get_rgb_uint8, get_shades, cell_mapper, echo_bytes
+from .playback import FrameClock, source_fps
+from .profiling import Profiler, untimed
+
+
+# a GOP longer than this many chunks is cut anyway, to bound the slot size
+MAX_CHUNK_SPAN: int = 8
+
+# worker side: the capture of the last chunk and the frame it stopped at
+_capture: tuple[str, VideoCapture, int] | None = None
+
+
+def make_encoder(shade: str, color: ColorMode, dither: bool) -> FrameEncoder | HalfBlockEncoder:
+    if shade == 'half':
+        return HalfBlockEncoder(color, dither)
+    return FrameEncoder(get_shades(shade), color, dither)
+
+
+def frame_bound(encoder: FrameEncoder | HalfBlockEncoder, size: tuple[int, int]) -> int:
+    '''Most bytes one encoded frame can take'''
+    width, height = size
+    return width * height * encoder.packer.width + len(HOME) + len(RESET)
+
+
+def keyframes(path: str) -> tuple[list[int], int] | None:
+    '''Keyframe indices of `path` and its frame count, read from the
+    packets without decoding them. None when the backend cannot tell.'''
+
+    if not hasattr(cv2, 'CAP_PROP_LRF_HAS_KEY_FRAME'): return None
+
+    cap: VideoCapture = VideoCapture(path, cv2.CAP_FFMPEG)
+    try:
+        # CAP_PROP_FORMAT -1: grab hands over the raw packets, nothing is decoded
+        if not cap.isOpened() or not cap.set(cv2.CAP_PROP_FORMAT, -1): return None
+
+        keys: list[int] = []
+        count: int = 0
+        while cap.grab():
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME): keys.append(count)
+            count += 1
+    finally:
+        cap.release()
+
+    return (keys, count) if keys else None
+
+
+def plan_chunks(first: int, total: int, chunk: int, keys: list[int]) -> list[tuple[int, int]]:
+    '''(first frame, frame count) of the chunks covering `first .. total`.
+
+    Every chunk but the first starts on a keyframe, so a worker's seek lands
+    on one and decodes nothing it does not render. Chunks run to the first
+    keyframe at least `chunk` frames on, and are only cut between keyframes
+    when that would take more than `MAX_CHUNK_SPAN` chunks.'''
+
+    spans: list[tuple[int, int]] = []
+    later: list[int] = [k for k in keys if k > first] + [total]
+    begin: int = first
+
+    for key in later:
+        # a long GOP is cut in the largest pieces allowed, each one seeks
+        while key - begin > MAX_CHUNK_SPAN * chunk:
+            spans.append((begin, MAX_CHUNK_SPAN * chunk))
+            begin += MAX_CHUNK_SPAN * chunk
+        if key - begin >= chunk or key == total:
+            if key > begin: spans.append((begin, key - begin))
+            begin = key
+
+    return spans
+
+
+def open_at(path: str, first: int) -> VideoCapture:
+    '''Worker side: a capture whose next frame is `first`. The previous
+    chunk's capture is kept, when this chunk carries on where it stopped
+    it is read on without a seek.'''
+
+    global _capture
+    if _capture is not None:
+        last_path, cap, position = _capture
+        if last_path == path and position == first:
+            return cap
+        cap.release()
+
+    cap: VideoCapture = VideoCapture(path)
+    if first: cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    _capture = (path, cap, first)
+    return cap
+
+
+def render_chunk(
+    path: str,
+    first: int,
+    count: int,
+    slot: str,
+    size: tuple[int, int],
+    shade: str,
+    _grayscale: Literal['mean', 'default'],
+    color: ColorMode,
+    dither: bool
+) -> list[int]:
+
+    '''Worker side: decodes frames `first .. first + count` of `path` and
+    writes them, encoded, one after the other into the shared memory block
+    `slot`. Returns the length of each frame, fewer than `count` at the end
+    of the file. The capture stays open for the worker's next chunk.'''
+
+    global _capture
+    cap: VideoCapture = open_at(path, first)
+    position: int = first
+
+    encoder: FrameEncoder | HalfBlockEncoder = make_encoder(shade, color, dither)
+    shades: NDArray = get_shades(shade)
+    width, height = size
+
+    shm: SharedMemory = SharedMemory(slot)
+    lengths: list[int] = []
+    offset: int = 0
+
+    try:
+        for _ in range(count):
+            ret, frame = cap.read()
+            if not ret: break
+            position += 1
+
+            if shade == 'half':
+                r, g, b = get_rgb_uint8(cell_mapper(1, _grayscale).resize(frame, (width, 2 * height)))
+                output: memoryview = encoder.encode(r, g, b)
+            else:
+                indices, r, g, b = get_cells(frame, size, shades, _grayscale)
+                output: memoryview = encoder.encode(r, g, b, indices)
+
+            shm.buf[offset:offset + len(output)] = output
+            offset += len(output)
+            lengths.append(len(output))
+    finally:
+        shm.close()
+        _capture = (path, cap, position)
+
+    return lengths
+
+
+def play(
+    path: str,
+    shade: Literal['solid', 'ascii', 'dot', 'half'] = 'ascii',
+    _grayscale: Literal['mean', 'default'] = 'mean',
+    speed: float = 1.0,
+    start: float = 0.0,
+    color: ColorMode = 'truecolor',
+    dither: bool = False,
+    workers: int | None = None,
+    chunk: int | None = None,
+    window: int | None = None,
+    profile: bool = False,
+    profile_out: str | None = None,
+    trace: str | None = None
+) -> None:
+
+    '''Plays a video file with decoding and rendering spread over `workers`
+    processes.
+
+    The file is cut into chunks of at least `chunk` frames (one second by
+    default) that start on keyframes, see `plan_chunks`, each rendered by
+    one worker into its own shared memory slot. A worker keeps its capture
+    open, so consecutive chunks on one worker need no seek at all. Chunks
+    are written out strictly in order, whichever worker finishes first. At most
+    `window` chunks (twice the workers by default) are in flight or waiting,
+    which caps memory at `window` slots. Frames that are late when their
+    turn comes are skipped, never written.
+
+    Frames are always encoded in full, as each chunk is rendered without the
+    previous one, and the grid is the terminal size when playback starts.'''
+
+    cap: VideoCapture = VideoCapture(path)
+    if not cap.isOpened():
+        raise Exception(f'Could not open {path}')
+
+    fps: float = source_fps(cap)
+    total: int = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 1 << 62  # unknown: read until a chunk comes back short
+    cap.release()
+
+    clock: FrameClock = FrameClock(fps, speed)
+    workers = workers or os.cpu_count() or 1
+    chunk   = chunk or max(1, round(fps))
+    window  = window or 2 * workers
+
+    first: int = min(int(start * fps), total)
+    scan: tuple[list[int], int] | None = keyframes(path)
+    if scan is not None:
+        spans: list[tuple[int, int]] = plan_chunks(first, scan[1], chunk, scan[0])
+    else:
+        # no keyframe information: fixed chunks, each seek may decode from the previous keyframe
+        spans: list[tuple[int, int]] = []
+
+    def span(index: int) -> tuple[int, int] | None:
+        if scan is not None:
+            return spans[index] if index < len(spans) else None
+        begin: int = first + index * chunk
+        return (begin, min(chunk, total - begin)) if begin < total else None
+
+    size: tuple[int, int] = tuple(os.get_terminal_size())
+    longest: int = max((count for _, count in spans), default=chunk)
+    bound: int = longest * frame_bound(make_encoder(shade, color, dither), size)
+
+    profiler: Profiler | None = Profiler.from_options(('wait', 'write'), profile, profile_out, trace)
+    timed = profiler if profiler is not None else untimed
+
+    # shared memory is only touched as it is written, the bound costs nothing
+    slots: list[SharedMemory] = [SharedMemory(create=True, size=bound) for _ in range(window)]
+    pending: dict[int, Future] = {}
+    pool: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(index: int) -> None:
+        if (planned := span(index)) is None: return
+        pending[index] = pool.submit(
+            render_chunk, path, *planned, slots[index % window].name, size, shade, _grayscale, color, dither
+        )
+
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+    try:
+        for index in range(window): submit(index)
+
+        frame: int = 0  # frames since `first`
+        index: int = 0
+
+        # the reorder buffer: chunk `index` is taken when it is done, the
+        # later ones finished before it wait in their slots
+        while index in pending:
+            lengths: list[int] = timed('wait', pending.pop(index).result)
+            slot: SharedMemory = slots[index % window]
+            if clock.origin is None: clock.start()
+
+            offset: int = 0
+            for length in lengths:
+                if not clock.late(frame):
+                    clock.wait(frame)
+                    timed('write', echo_bytes, slot.buf[offset:offset + length])
+                offset += length
+                frame += 1
+
+            if len(lengths) < span(index)[1]: break
+
+            # the slot is free again, reuse it for the chunk `window` ahead
+            submit(index + window)
+            index += 1
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        for slot in slots:
+            slot.close()
+            slot.unlink()
+        os.system('cls' if os.name == 'nt' else 'clear')
+        if profiler is not None:
+            profiler.finish()
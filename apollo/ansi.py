@@ -0,0 +1,435 @@
+# ansi.py
+# Byte level encoding of ANSI frames
+
+from __future__ import annotations
+
+import numpy as np
+
+from functools import lru_cache
+from numpy.typing import NDArray
+from typing import Iterable, Literal, NamedTuple, Sequence
+
+
+HOME:  bytes = b'\033[H'
+RESET: bytes = b'\033[0m'
+
+
+class Field(NamedTuple):
+    '''Lookup table of byte strings, one zero padded row per value.
+    `valid` flags which bytes of each row belong to the string.'''
+    table: NDArray
+    valid: NDArray
+
+    @property
+    def width(self) -> int:
+        return self.table.shape[1]
+
+
+def field(strings: Iterable[bytes]) -> Field:
+    strings: list[bytes] = list(strings)
+    width: int = max(len(s) for s in strings)
+
+    table: NDArray = np.zeros((len(strings), width), dtype=np.uint8)
+    valid: NDArray = np.zeros((len(strings), width), dtype=bool)
+
+    for i, s in enumerate(strings):
+        table[i, :len(s)] = np.frombuffer(s, dtype=np.uint8)
+        valid[i, :len(s)] = True
+
+    return Field(table, valid)
+
+
+def literal(s: bytes) -> Field:
+    return field([s])
+
+
+def decimal(n: int, end: bytes = b'') -> Field:
+    '''`0..n-1` as ascii decimals, each followed by `end`'''
+    return field(b'%d%s' % (i, end) for i in range(n))
+
+
+def glyphs(shades: Sequence[str]) -> Field:
+    return field(str(c).encode('utf-8') for c in shades)
+
+
+class Packer:
+    '''Packs cells laid out as a fixed sequence of fields into one reusable buffer.
+
+    Every cell is first written as a record holding the widest form of each
+    field, straight from the lookup tables. The padding is then dropped with a
+    single `np.compress`, so the cost scales with the number of cells instead
+    of the number of Python string objects.'''
+
+    def __init__(self, layout: Sequence[Field]) -> None:
+        self.layout:  list[Field] = list(layout)
+        self.offsets: list[int]   = np.cumsum([0] + [f.width for f in self.layout]).tolist()
+        self.width:   int         = self.offsets[-1]
+
+        self._records: NDArray   = np.empty((0, self.width), dtype=np.uint8)
+        self._mask:    NDArray   = np.empty((0, self.width), dtype=bool)
+        self._buffer:  bytearray = bytearray()
+
+    def _reserve(self, cells: int, extra: int) -> None:
+        if self._records.shape[0] < cells:
+            self._records = np.empty((cells, self.width), dtype=np.uint8)
+            self._mask    = np.empty((cells, self.width), dtype=bool)
+
+        if len(self._buffer) < cells * self.width + extra:
+            # a new object, older memoryviews keep pointing at the old one
+            self._buffer = bytearray(cells * self.width + extra)
+
+    def pack(
+        self,
+        cells: int,
+        values: Sequence[NDArray | None],
+        include: Sequence[NDArray | None] | None = None,
+        head: bytes = b'',
+        tail: bytes = b''
+    ) -> memoryview:
+
+        '''`values[i]` holds the flat table index of field `i` for every cell
+        (`None` for literals), `include[i]` optionally masks the cells in which
+        field `i` is written at all.'''
+
+        self._reserve(cells, len(head) + len(tail))
+
+        records: NDArray = self._records[:cells]
+        mask:    NDArray = self._mask[:cells]
+
+        for i, f in enumerate(self.layout):
+            start, stop = self.offsets[i], self.offsets[i + 1]
+
+            if values[i] is None:
+                records[:, start:stop] = f.table[0]
+                mask[:, start:stop]    = f.valid[0]
+            else:
+                np.take(f.table, values[i], axis=0, out=records[:, start:stop], mode='clip')
+                np.take(f.valid, values[i], axis=0, out=mask[:, start:stop],    mode='clip')
+
+            if include is not None and include[i] is not None:
+                mask[:, start:stop] &= include[i][:, None]
+
+        total: int = int(np.count_nonzero(mask))
+        h, t = len(head), len(tail)
+
+        out: NDArray = np.frombuffer(self._buffer, dtype=np.uint8)
+        out[:h] = np.frombuffer(head, dtype=np.uint8)
+        np.compress(mask.ravel(), records.ravel(), out=out[h:h + total])
+        out[h + total:h + total + t] = np.frombuffer(tail, dtype=np.uint8)
+
+        return memoryview(self._buffer)[:h + total + t]
+
+
+ColorMode = Literal['truecolor', '256', '16', 'none']
+
+# xterm defaults, terminals are free to change them
+XTERM_16: tuple = (
+    (0, 0, 0),     (205, 0, 0),   (0, 205, 0),   (205, 205, 0),
+    (0, 0, 238),   (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0),   (255, 255, 0),
+    (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+)
+
+BAYER_4X4: NDArray = np.array([
+    [ 0,  8,  2, 10],
+    [12,  4, 14,  6],
+    [ 3, 11,  1,  9],
+    [15,  7, 13,  5],
+])
+
+
+def xterm_256() -> NDArray:
+    '''RGB of the 256 color palette: the 16 system colors, a 6x6x6 cube and
+    24 grays'''
+    levels: NDArray = np.array([0, 95, 135, 175, 215, 255])
+    cube:   NDArray = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    grays:  NDArray = np.repeat(np.arange(8, 248, 10)[:, None], 3, axis=1)
+    return np.concatenate([np.array(XTERM_16), cube, grays])
+
+
+@lru_cache(maxsize=None)
+def palette_lut(mode: Literal['256', '16']) -> NDArray:
+    '''32x32x32 table from the top 5 bits of (R, G, B) to the nearest palette
+    index, so quantizing a frame is a single lookup per pixel. The 256 color
+    mode skips the system colors, whose actual values vary across terminals.'''
+
+    first: int = 16 if mode == '256' else 0
+    palette: NDArray = xterm_256()[first:] if mode == '256' else xterm_256()[:16]
+    palette = palette.astype(np.float32)
+
+    centers: NDArray = (np.arange(32, dtype=np.float32) * 8 + 4)
+    grid: NDArray = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+
+    # |c - p|^2 = |c|^2 - 2 c.p + |p|^2, the |c|^2 term does not change the argmin
+    distance: NDArray = (palette ** 2).sum(axis=1) - 2 * grid @ palette.T
+    return (np.argmin(distance, axis=1) + first).astype(np.uint8).reshape(32, 32, 32)
+
+
+class Palette:
+    '''Turns pixels into the color fields of one output mode.
+
+    `truecolor` writes `38;2;R;G;B`, `256` and `16` look each pixel up in
+    `palette_lut` (after ordered dithering if `dither`), `none` drops color.
+    `color` returns one row of table indices per cell, `columns` spreads them
+    over the fields of `layout`. With `background` the fields set the
+    background color instead, from the same table indices.'''
+
+    # dither amplitude, about one palette step
+    SPREAD: dict = {'256': 40, '16': 96}
+
+    def __init__(self, mode: ColorMode = 'truecolor', dither: bool = False, background: bool = False) -> None:
+        sgr: int = 48 if background else 38
+        if mode == 'truecolor':
+            self.layout: list[tuple[Field, int | None]] = [
+                (literal(b'\033[%d;2;' % sgr), None),
+                (decimal(256, b';'), 0),
+                (decimal(256, b';'), 1),
+                (decimal(256, b'm'), 2),
+            ]
+        elif mode == '256':
+            self.layout = [(field(b'\033[%d;5;%dm' % (sgr, i) for i in range(256)), 0)]
+        elif mode == '16':
+            self.layout = [(field(b'\033[%dm' % (sgr - 8 + i if i < 8 else sgr + 44 + i) for i in range(16)), 0)]
+        elif mode == 'none':
+            self.layout = []
+        else:
+            raise ValueError(f'Unknown color mode: {mode}')
+
+        self.mode:     ColorMode = mode
+        self.dither:   bool      = dither and mode in self.SPREAD
+        self.channels: int       = sum(c is not None for _, c in self.layout)
+
+        self._lut:       NDArray | None = palette_lut(mode) if mode in self.SPREAD else None
+        self._threshold: NDArray | None = None
+
+    @property
+    def fields(self) -> list[Field]:
+        return [f for f, _ in self.layout]
+
+    def columns(self, colors: NDArray) -> list[NDArray | None]:
+        return [None if c is None else colors[:, c] for _, c in self.layout]
+
+    def _dither(self, channel: NDArray) -> NDArray:
+        if self._threshold is None or self._threshold.shape != channel.shape:
+            height, width = channel.shape
+            tiled: NDArray = np.tile(BAYER_4X4, (height // 4 + 1, width // 4 + 1))[:height, :width]
+            self._threshold = ((tiled - 7.5) / 16 * self.SPREAD[self.mode]).astype(np.int16)
+        return np.clip(channel + self._threshold, 0, 255).astype(np.uint8)
+
+    def color(self, r: NDArray, g: NDArray, b: NDArray) -> NDArray:
+        if self.mode == 'truecolor':
+            return np.stack((r, g, b), axis=-1)
+
+        if self.mode == 'none':
+            return np.empty(r.shape + (0,), dtype=np.uint8)
+
+        if self.dither:
+            r, g, b = self._dither(r), self._dither(g), self._dither(b)
+
+        return self._lut[r >> 3, g >> 3, b >> 3][..., None]
+
+
+def recolor_mask(colors: NDArray, starts: NDArray) -> NDArray:
+    '''Cells whose color sequence has to be written: the first of a run and
+    every one whose color differs from the cell before it'''
+    recolor: NDArray = starts.copy()
+    recolor[1:] |= (colors[1:] != colors[:-1]).any(axis=1)
+    return recolor
+
+
+def half_rows(colors: NDArray) -> tuple[NDArray, NDArray]:
+    '''Top and bottom pixel of every half block cell, from a grid of pixel rows'''
+    rows: int = colors.shape[0] // 2 * 2
+    return colors[0:rows:2], colors[1:rows:2]
+
+
+class FrameEncoder:
+    '''`(R, G, B, CHAR) --> \\033[38;2;R;G;BmCHAR\\033[0m` for every cell of a frame.
+
+    Drop-in replacement for `add_ansi` + `join`, producing the frame as bytes
+    ready for `sys.stdout.buffer`. Rows are written in display order. Other
+    `color` modes swap the color sequence, see `Palette`.'''
+
+    def __init__(self, shades: Sequence[str], color: ColorMode = 'truecolor', dither: bool = False) -> None:
+        self.palette: Palette = Palette(color, dither)
+        self.suffix:  list[Field] = [literal(RESET)] if self.palette.layout else []
+        self.packer:  Packer = Packer(self.palette.fields + [glyphs(shades)] + self.suffix)
+
+    def encode(self, r: NDArray, g: NDArray, b: NDArray, indices: NDArray | int) -> memoryview:
+        indices: NDArray = np.broadcast_to(indices, r.shape)
+        colors:  NDArray = self.palette.color(r, g, b).reshape(r.size, -1)
+        return self.packer.pack(
+            r.size,
+            self.palette.columns(colors) + [indices.ravel()] + [None] * len(self.suffix),
+            head=HOME
+        )
+
+
+class DeltaEncoder:
+    '''Redraws only the cells whose glyph or color changed since the last
+    frame written. In truecolor, colors that moved at most `tolerance` (per
+    channel) count as unchanged; palette modes compare palette indices.
+
+    Changed cells are grouped into runs along a row: a run starts with a
+    cursor move, a color sequence is only written when it differs from the
+    previous cell of the run, and the colors are reset once per run.'''
+
+    def __init__(
+        self,
+        shades: Sequence[str],
+        tolerance: int = 0,
+        color: ColorMode = 'truecolor',
+        dither: bool = False
+    ) -> None:
+
+        self.glyphs:    Field   = glyphs(shades)
+        self.palette:   Palette = Palette(color, dither)
+        self.suffix:    list[Field] = [literal(RESET)] if self.palette.layout else []
+        self.tolerance: int     = tolerance if color == 'truecolor' else 0
+
+        self.packer:  Packer  | None = None
+        self._glyphs: NDArray | None = None
+        self._colors: NDArray | None = None
+
+    def reset(self, shape: tuple[int, int]) -> None:
+        '''Forgets the previous frame, the next one is drawn in full'''
+        height, width = shape
+        self.packer = Packer([
+            literal(b'\033['),
+            decimal(height + 1, b';'),
+            decimal(width + 1, b'H'),
+            *self.color_fields,
+            self.glyphs,
+            *self.suffix,
+        ])
+        self._glyphs = np.full(shape, -1, dtype=np.int16)
+        self._colors = np.zeros(shape + (self.channels,), dtype=np.uint8)
+
+    @property
+    def color_fields(self) -> list[Field]:
+        return self.palette.fields
+
+    @property
+    def channels(self) -> int:
+        return self.palette.channels
+
+    def cell_colors(self, r: NDArray, g: NDArray, b: NDArray) -> NDArray:
+        return self.palette.color(r, g, b)
+
+    def color_columns(self, colors: NDArray, starts: NDArray) -> tuple[list, list]:
+        '''Table indices and include masks of the color fields of the changed cells'''
+        return self.palette.columns(colors), [recolor_mask(colors, starts)] * len(self.palette.layout)
+
+    def changed(self, colors: NDArray, indices: NDArray) -> NDArray:
+        changed: NDArray = self._glyphs != indices
+
+        if self.tolerance > 0:
+            diff: NDArray = np.abs(colors.astype(np.int16) - self._colors).max(axis=-1)
+            changed |= diff > self.tolerance
+        else:
+            changed |= (colors != self._colors).any(axis=-1)
+
+        return changed
+
+    def encode(self, r: NDArray, g: NDArray, b: NDArray, indices: NDArray | int) -> memoryview:
+        colors:  NDArray = self.cell_colors(r, g, b)
+        shape:   tuple[int, int] = colors.shape[:2]
+        indices: NDArray = np.broadcast_to(indices, shape)
+
+        head: bytes = b''
+        if self._glyphs is None or self._glyphs.shape != shape:
+            self.reset(shape)
+            head = b'\033[2J'
+
+        changed: NDArray = self.changed(colors, indices)
+        self._glyphs[changed] = indices[changed]
+        self._colors[changed] = colors[changed]
+
+        width: int = shape[1]
+        pos:   NDArray = np.flatnonzero(changed)
+
+        # a run breaks on a gap or at the start of a row
+        starts: NDArray = np.ones(pos.size, dtype=bool)
+        starts[1:] = (pos[1:] != pos[:-1] + 1) | (pos[1:] % width == 0)
+        ends: NDArray = np.ones(pos.size, dtype=bool)
+        ends[:-1] = starts[1:]
+
+        colors = colors.reshape(shape[0] * width, -1)[pos]
+        values, recolor = self.color_columns(colors, starts)
+
+        return self.packer.pack(
+            pos.size,
+            [None, pos // width + 1, pos % width + 1]
+            + values + [indices.ravel()[pos]] + [None] * len(self.suffix),
+            include=[starts] * 3 + recolor + [None] + [ends] * len(self.suffix),
+            head=head
+        )
+
+
+class HalfBlockEncoder:
+    '''Two pixels per cell: `▀` in the color of the top pixel over a
+    background in the color of the bottom one.
+
+    Takes the R, G, B of a grid twice as tall as the cells (glyph indices are
+    ignored). Foreground and background sequences are each written only when
+    they differ from the previous cell, so flat areas cost the glyph alone.'''
+
+    def __init__(self, color: ColorMode = 'truecolor', dither: bool = False) -> None:
+        if color == 'none':
+            raise ValueError('Half blocks need a color mode.')
+
+        self.palette:    Palette = Palette(color, dither)
+        self.background: Palette = Palette(color, dither, background=True)
+        self.packer: Packer = Packer(self.palette.fields + self.background.fields + [literal('▀'.encode())])
+
+    def encode(self, r: NDArray, g: NDArray, b: NDArray, indices: NDArray | int = 0) -> memoryview:
+        top, bottom = half_rows(self.palette.color(r, g, b))
+        cells: int = top.shape[0] * top.shape[1]
+        top, bottom = top.reshape(cells, -1), bottom.reshape(cells, -1)
+
+        first: NDArray = np.zeros(cells, dtype=bool)
+        first[:1] = True
+
+        return self.packer.pack(
+            cells,
+            self.palette.columns(top) + self.background.columns(bottom) + [None],
+            include=[recolor_mask(top, first)] * len(self.palette.layout)
+                  + [recolor_mask(bottom, first)] * len(self.background.layout) + [None],
+            head=HOME,
+            tail=RESET
+        )
+
+
+class HalfDeltaEncoder(DeltaEncoder):
+    '''`DeltaEncoder` for half blocks: a cell is redrawn when either of its
+    pixels changed, foreground and background are recolored independently
+    along a run. Takes the same input as `HalfBlockEncoder`.'''
+
+    def __init__(self, tolerance: int = 0, color: ColorMode = 'truecolor', dither: bool = False) -> None:
+        if color == 'none':
+            raise ValueError('Half blocks need a color mode.')
+
+        super().__init__(['▀'], tolerance, color, dither)
+        self.background: Palette = Palette(color, dither, background=True)
+
+    @property
+    def color_fields(self) -> list[Field]:
+        return self.palette.fields + self.background.fields
+
+    @property
+    def channels(self) -> int:
+        return 2 * self.palette.channels
+
+    def cell_colors(self, r: NDArray, g: NDArray, b: NDArray) -> NDArray:
+        return np.concatenate(half_rows(self.palette.color(r, g, b)), axis=-1)
+
+    def color_columns(self, colors: NDArray, starts: NDArray) -> tuple[list, list]:
+        top, bottom = np.split(colors, 2, axis=1)
+        return (
+            self.palette.columns(top) + self.background.columns(bottom),
+            [recolor_mask(top, starts)] * len(self.palette.layout)
+            + [recolor_mask(bottom, starts)] * len(self.background.layout)
+        )
+
+    def encode(self, r: NDArray, g: NDArray, b: NDArray, indices: NDArray | int = 0) -> memoryview:
+        return super().encode(r, g, b, 0)
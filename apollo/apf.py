@@ -0,0 +1,237 @@
+# apf.py
+# Pre-rendered frame files: convert a video once, replay it for free
+#
+# Layout, little endian:
+#   header   magic 'APF1', version u16, flags u16, width u16, height u16,
+#            frame count u32, fps f32, index offset u64, shades length u16,
+#            followed by the shades as utf-8
+#   frames   key:   glyph index per cell (u8) then R, G, B per cell (u8)
+#            delta: changed cell positions (u32), their glyph indices (u8)
+#                   and their R, G, B (u8)
+#   index    offset u64, length u32, kind u8 per frame
+
+from __future__ import annotations
+
+import mmap
+import numpy as np
+import os
+import struct
+
+from cv2 import VideoCapture
+from numpy.typing import NDArray
+from typing import Literal
+
+from .ansi import DeltaEncoder, ColorMode
+from .ascii import get_cells, get_shades, echo_bytes
+from .playback import FrameClock, source_fps
+
+
+MAGIC:   bytes = b'APF1'
+VERSION: int   = 1
+HEADER:  struct.Struct = struct.Struct('<4sHHHHIfQH')
+INDEX:   np.dtype = np.dtype([('offset', '<u8'), ('length', '<u4'), ('kind', 'u1')])
+
+KEY, DELTA = 0, 1
+FLAG_DELTA: int = 1
+
+
+class Writer:
+    '''Appends frames to an apf file. A frame is stored as the changes since
+    the previous one when that is smaller, with a key frame at least every
+    `keyframe_interval` frames so playback can seek.'''
+
+    def __init__(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        fps: float,
+        shades: NDArray,
+        delta: bool = True,
+        keyframe_interval: int = 60
+    ) -> None:
+
+        self.file = open(path, 'wb')
+        self.width, self.height, self.fps = width, height, fps
+        self.shades: bytes = ''.join(shades).encode('utf-8')
+        self.delta: bool = delta
+        self.keyframe_interval: int = keyframe_interval
+
+        self.index: list[tuple[int, int, int]] = []
+        self._glyphs: NDArray | None = None
+        self._rgb:    NDArray | None = None
+
+        self.file.write(self._header(0))
+        self.file.write(self.shades)
+
+    def _header(self, index_offset: int) -> bytes:
+        return HEADER.pack(MAGIC, VERSION, FLAG_DELTA if self.delta else 0,
+                           self.width, self.height, len(self.index), self.fps,
+                           index_offset, len(self.shades))
+
+    def write(self, indices: NDArray, r: NDArray, g: NDArray, b: NDArray) -> None:
+        glyphs: NDArray = indices.astype(np.uint8).ravel()
+        rgb:    NDArray = np.stack((r, g, b), axis=-1).reshape(-1, 3)
+
+        payload: bytes = b''
+        kind: int = KEY
+
+        keyframe_due: bool = len(self.index) % self.keyframe_interval == 0
+        if self.delta and self._glyphs is not None and not keyframe_due:
+            pos: NDArray = np.flatnonzero((glyphs != self._glyphs) | (rgb != self._rgb).any(axis=1))
+            if 8 * pos.size < 4 * glyphs.size:
+                kind = DELTA
+                payload = pos.astype('<u4').tobytes() + glyphs[pos].tobytes() + rgb[pos].tobytes()
+
+        if kind == KEY:
+            payload = glyphs.tobytes() + rgb.tobytes()
+
+        self.index.append((self.file.tell(), len(payload), kind))
+        self.file.write(payload)
+        self._glyphs, self._rgb = glyphs, rgb
+
+    def close(self) -> None:
+        index_offset: int = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX).tobytes())
+        self.file.seek(0)
+        self.file.write(self._header(index_offset))
+        self.file.close()
+
+
+class Reader:
+    '''Memory maps an apf file. `frame(i)` updates the glyph and color grids
+    in place, straight from the mapped bytes.'''
+
+    def __init__(self, path: str) -> None:
+        self.file = open(path, 'rb')
+        self.map: mmap.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, width, height, frames, fps, index_offset, shades_len = \
+            HEADER.unpack_from(self.map, 0)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not an apf file.')
+
+        self.width, self.height, self.fps = width, height, fps
+        self.frames: int = frames
+        self.shades: list[str] = list(self.map[HEADER.size:HEADER.size + shades_len].decode('utf-8'))
+        self.index: NDArray = np.frombuffer(self.map, dtype=INDEX, count=frames, offset=index_offset)
+
+        self.glyphs: NDArray = np.zeros(width * height, dtype=np.uint8)
+        self.rgb:    NDArray = np.zeros((width * height, 3), dtype=np.uint8)
+        self.position: int = -1
+
+    def _apply(self, i: int) -> None:
+        offset, length, kind = self.index[i]
+        offset, length = int(offset), int(length)
+        cells: int = self.glyphs.size
+
+        if kind == KEY:
+            self.glyphs[:] = np.frombuffer(self.map, np.uint8, cells, offset)
+            self.rgb[:]    = np.frombuffer(self.map, np.uint8, 3 * cells, offset + cells).reshape(-1, 3)
+        else:
+            n: int = length // 8
+            pos: NDArray = np.frombuffer(self.map, '<u4', n, offset)
+            self.glyphs[pos] = np.frombuffer(self.map, np.uint8, n, offset + 4 * n)
+            self.rgb[pos]    = np.frombuffer(self.map, np.uint8, 3 * n, offset + 5 * n).reshape(-1, 3)
+
+        self.position = i
+
+    def frame(self, i: int) -> None:
+        if i != self.position + 1:
+            # seek: replay from the last key frame at or before i
+            keys: NDArray = np.flatnonzero(self.index['kind'][:i + 1] == KEY)
+            start: int = int(keys[-1]) if keys.size else 0
+            if not (start <= self.position < i): self.position = start - 1
+
+        for j in range(self.position + 1, i + 1):
+            self._apply(j)
+
+    def grid(self) -> tuple[NDArray, NDArray, NDArray, NDArray]:
+        '''Glyph index and R, G, B grids of the current frame'''
+        shape: tuple[int, int] = (self.height, self.width)
+        rgb: NDArray = self.rgb.reshape(shape + (3,))
+        return self.glyphs.reshape(shape), rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+    def close(self) -> None:
+        self.index = None  # release the exported buffer before closing the map
+        self.map.close()
+        self.file.close()
+
+
+def render(
+    source: str,
+    output: str,
+    size: tuple[int, int] | None = None,
+    shade: Literal['solid', 'ascii', 'dot'] = 'ascii',
+    _grayscale: Literal['mean', 'default'] = 'mean',
+    delta: bool = True
+) -> None:
+
+    '''Converts `source` into an apf file at a `(width, height)` grid, the
+    current terminal size by default'''
+
+    cap: VideoCapture = VideoCapture(source)
+    if not cap.isOpened():
+        raise Exception(f'Could not open {source}')
+
+    width, height = size if size else os.get_terminal_size()
+    shades: NDArray = get_shades(shade)
+
+    writer: Writer = Writer(output, width, height, source_fps(cap), shades, delta)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret: break
+            writer.write(*get_cells(frame, (width, height), shades, _grayscale))
+    finally:
+        writer.close()
+        cap.release()
+
+    print(f'Rendered {len(writer.index)} frames ({width}x{height}) to {output}: '
+          f'{os.path.getsize(output) / 1e6:.1f} MB')
+
+
+def play(
+    path: str,
+    tolerance: int = 0,
+    speed: float = 1.0,
+    start: float = 0.0,
+    color: ColorMode = 'truecolor',
+    dither: bool = False
+) -> None:
+
+    '''Streams an apf file at its frame rate times `speed`. Output is always
+    delta encoded: it positions every row itself, so a grid smaller than the
+    terminal still lines up. Frames that are late are applied to the grid but
+    never encoded.'''
+
+    reader: Reader = Reader(path)
+    encoder: DeltaEncoder = DeltaEncoder(reader.shades, tolerance, color, dither)
+    first: int = min(int(start * reader.fps), reader.frames)
+    clock: FrameClock = FrameClock(reader.fps, speed, first)
+
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+    try:
+        clock.start()
+        i: int = first
+
+        while i < reader.frames:
+            # jump to the frame due now when behind
+            i = max(i, clock.due())
+            if i >= reader.frames: break
+
+            reader.frame(i)
+            indices, r, g, b = reader.grid()
+            echo_bytes(encoder.encode(r, g, b, indices))
+
+            i += 1
+            clock.wait(i)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        reader.close()
+        os.system('cls' if os.name == 'nt' else 'clear')
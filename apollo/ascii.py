@@ -11,12 +11,15 @@ import colorama
 import math
 import time
 
+from functools import lru_cache, partial
 from math import cos, sin, pi
 from cv2 import VideoCapture
 from numpy.typing import NDArray
 from typing import Literal
 
-from .download import download
+from .ansi import FrameEncoder, DeltaEncoder, HalfBlockEncoder, HalfDeltaEncoder, ColorMode
+from .playback import Pipeline, PlaybackClock, ReadAhead, QualityController
+from .profiling import Profiler, untimed
 
 
 def echo(buffer: str, flush: bool = True) -> None:
@@ -25,6 +28,13 @@ def echo(buffer: str, flush: bool = True) -> None:
     if flush: sys.stdout.flush()
 
 
+def echo_bytes(buffer: bytes | memoryview, flush: bool = True) -> None:
+    '''Faster than echo, skips the text layer of stdout'''
+    sys.stdout.flush()
+    sys.stdout.buffer.write(buffer)
+    if flush: sys.stdout.buffer.flush()
+
+
 def resize(img: NDArray, shape: tuple[int, int]) -> NDArray:
     return cv2.resize(img, shape, interpolation=cv2.INTER_AREA)
 
@@ -46,9 +56,10 @@ def get_grayscale(pixels: NDArray) -> NDArray:
 
 
 def get_rgb_uint8(pixels: NDArray) -> tuple[NDArray]:
-    r: NDArray = pixels[..., 2].astype(np.uint8)
-    g: NDArray = pixels[..., 1].astype(np.uint8)
-    b: NDArray = pixels[..., 0].astype(np.uint8)
+    # views, not copies, when the pixels already are uint8
+    r: NDArray = pixels[..., 2].astype(np.uint8, copy=False)
+    g: NDArray = pixels[..., 1].astype(np.uint8, copy=False)
+    b: NDArray = pixels[..., 0].astype(np.uint8, copy=False)
     return r, g, b
 
 
@@ -79,165 +90,440 @@ def join(colored_chars: NDArray) -> str:
     return ('\033[H' + ''.join([''.join(row[::-1]) for row in colored_chars]))
 
 
+def get_shades(shade: Literal['solid', 'ascii', 'dot', 'half']) -> NDArray:
+    shades = \
+    np.array(list(' _.,-=+;:cba!?0123456789$W#@Ñ')) if shade == 'ascii' else \
+    np.array(list('█'))                             if shade == 'solid' else \
+    np.array(list('•'))                             if shade == 'dot'   else \
+    np.array(list('▀'))                             if shade == 'half'  else None
+
+    if shades is None:
+        raise TypeError(f'{shade} if not a vaild shade type')
+
+    return shades
+
+
+def glyph_lut(levels: int, scale: int = 1) -> NDArray:
+    '''Glyph index of every gray level 0 .. 255 * `scale`, the same argmin
+    `get_ilum_idx` finds per pixel, done once per shade set'''
+    gray: NDArray = np.arange(255 * scale + 1, dtype=np.float64) / scale
+    lut: NDArray = np.zeros(gray.size, dtype=np.uint8)
+    if levels > 1:
+        lut[:] = get_ilum_idx(gray, np.linspace(0, 255, levels, dtype=np.float32))
+    return lut
+
+
+class CellMapper:
+    '''`get_cells` on uint8 data with buffers reused across frames.
+
+    The gray level of a cell is the sum of its channels for `mean` (so the
+    lookup matches the float mean exactly) and `get_grayscale` in OpenCV's
+    fixed point for `default`. A lookup table turns it into a glyph index, the
+    R, G, B returned are views of the resized frame.'''
+
+    def __init__(self, levels: int, _grayscale: Literal['mean', 'default']) -> None:
+        if _grayscale not in ('mean', 'default'):
+            raise TypeError(f'{_grayscale} is not a valid grayscale method')
+
+        self.mean: bool = _grayscale == 'mean'
+        self.lut: NDArray = glyph_lut(levels, 3 if self.mean else 1)
+
+        self._shape: tuple[int, int] | None = None
+
+    def _allocate(self, shape: tuple[int, int]) -> None:
+        width, height = shape
+        self._shape = shape
+        self._pixels:  NDArray = np.empty((height, width, 3), dtype=np.uint8)
+        self._gray:    NDArray = np.empty((height, width), dtype=np.uint16 if self.mean else np.uint8)
+        self._indices: NDArray = np.empty((height, width), dtype=np.uint8)
+
+    def resize(self, frame: NDArray, shape: tuple[int, int]) -> NDArray:
+        if shape != self._shape: self._allocate(shape)
+        if frame.ndim == 3 and frame.shape[2] == 3 and frame.dtype == np.uint8:
+            return cv2.resize(frame, shape, dst=self._pixels, interpolation=cv2.INTER_AREA)
+        return resize(frame, shape)[..., :3]  # unusual input, let OpenCV allocate
+
+    def grayscale(self, pixels: NDArray) -> NDArray:
+        if self.mean:
+            return np.sum(pixels, axis=-1, dtype=np.uint16, out=self._gray)
+        # RGB2GRAY on BGR pixels on purpose: `get_grayscale` weighs the
+        # channels in that order, this keeps the look of the float version
+        return cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY, dst=self._gray)
+
+    def glyphs(self, gray: NDArray) -> NDArray:
+        return np.take(self.lut, gray, out=self._indices)
+
+    def __call__(self, frame: NDArray, shape: tuple[int, int]) -> tuple[NDArray, NDArray, NDArray, NDArray]:
+        pixels: NDArray = self.resize(frame, shape)
+        indices: NDArray = self.glyphs(self.grayscale(pixels))
+        return indices, pixels[..., 2], pixels[..., 1], pixels[..., 0]
+
+
+@lru_cache(maxsize=8)
+def cell_mapper(levels: int, _grayscale: Literal['mean', 'default']) -> CellMapper:
+    return CellMapper(levels, _grayscale)
+
+
+def get_cells(
+    frame: NDArray,
+    shape: tuple[int, int],
+    shades: NDArray,
+    _grayscale: Literal['mean', 'default']
+) -> tuple[NDArray, NDArray, NDArray, NDArray]:
+
+    '''Glyph index and R, G, B of every cell of a `(width, height)` grid.
+    The arrays are reused by the next call with the same shade count.'''
+
+    # no cv2.flip here: `join` used to mirror every row back, the encoders
+    # write rows in display order instead
+    return cell_mapper(len(shades), _grayscale)(frame, shape)
+
+
 def echo_video(
-    shade: Literal['solid', 'ascii', 'dot'],
+    shade: Literal['solid', 'ascii', 'dot', 'half'],
     _grayscale: Literal['mean', 'default'],
-    camera: int = 0
+    camera: int = 0,
+    delta: bool = False,
+    tolerance: int = 0,
+    pipeline: bool = False,
+    speed: float = 1.0,
+    start: float = 0.0,
+    buffer: float = 0.0,
+    color: ColorMode = 'truecolor',
+    dither: bool = False,
+    target_fps: float | None = None,
+    profile: bool = False,
+    profile_out: str | None = None,
+    trace: str | None = None
 ) -> None:
 
+    '''Video files play at their own frame rate times `speed`, starting
+    `start` seconds in. A camera index is read as fast as it delivers.
+    With `buffer` seconds > 0 frames are decoded that far ahead, playback
+    begins once the buffer is full (meant for network streams).
+
+    `delta` only redraws the cells that changed since the previous frame,
+    colors within `tolerance` of what is on screen count as unchanged.
+
+    `color` picks truecolor, 256 or 16 color sequences or none at all,
+    `dither` applies ordered dithering before quantizing to a palette.
+    The `half` shade draws two pixels per cell (see `HalfBlockEncoder`) and
+    needs a color mode.
+
+    `pipeline` runs capture, render and output on separate threads. Live
+    sources (a camera index) then drop stale frames instead of lagging,
+    the number of dropped frames is reported on exit.
+
+    `target_fps` lowers grid size, color depth and shade set step by step
+    while frames take longer than that rate allows (see `QualityController`).
+    Output is then always delta encoded, since a smaller grid needs its rows
+    positioned.
+
+    `profile` times every stage of every frame and prints percentiles on
+    exit, `profile_out` and `trace` also save them as JSON or as a Chrome
+    trace (see `Profiler`). For files `read` includes the wait for the
+    frame to be due.'''
+
     colorama.init()
 
+    shades: NDArray = get_shades(shade)
+    half: bool = shade == 'half'
+
+    def make_encoder(
+        cells: NDArray, color: ColorMode, delta: bool
+    ) -> FrameEncoder | DeltaEncoder | HalfBlockEncoder:
+        if half:
+            return HalfDeltaEncoder(tolerance, color, dither) if delta else HalfBlockEncoder(color, dither)
+        return DeltaEncoder(cells, tolerance, color, dither) if delta else FrameEncoder(cells, color, dither)
+
+    controller: QualityController | None = QualityController(target_fps) if target_fps else None
+    encoder: FrameEncoder | DeltaEncoder | HalfBlockEncoder = make_encoder(shades, color, delta or bool(controller))
+    level: int = 0
+    render_time: float = 0.0
+
+    # opened after the encoder, which rejects invalid options, so a bad one leaks no capture
     cap: VideoCapture = VideoCapture(camera)
 
     if not cap.isOpened():
         raise Exception('Could Not open the webcam')
 
-    shades = \
-    np.array(list(' _.,-=+;:cba!?0123456789$W#@Ñ')) if shade == 'ascii' else \
-    np.array(list('█'))                             if shade == 'solid' else \
-    np.array(list('•'))                             if shade == 'dot'   else None
+    if buffer > 0:
+        if start > 0: cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+        cap, start = ReadAhead(cap, buffer), 0.0
 
-    if shades is None:
-        raise TypeError(f'{shade} if not a vaild shade type')
-
-    os.system('cls' if os.name == 'nt' else 'clear')
+    profiler: Profiler | None = Profiler.from_options(VIDEO_STAGES, profile, profile_out, trace)
+    timed = profiler if profiler is not None else untimed
 
-    while True:
+    def read() -> NDArray | None:
         ret, frame = cap.read()
-        if not ret: break
+        return frame if ret else None
 
-        width, height = os.get_terminal_size()
-        frame = cv2.flip(frame, 1)
-        pixels: NDArray = resize(frame, (width, height))
+    if not isinstance(camera, int):
+        read = PlaybackClock(cap, speed, start).read
 
-        if _grayscale == 'mean': grayscale: NDArray = get_mean_grayscale(pixels)
-        elif _grayscale == 'default': grayscale: NDArray = get_grayscale(pixels)
+    if profiler is not None:
+        read = partial(profiler, 'read', read)
 
-        linspace_rgb: NDArray = np.linspace(0, 255, len(shades), dtype=np.float32)
-        indices: NDArray = get_ilum_idx(grayscale, linspace_rgb)
-        chars: NDArray = shades[indices]
+    def render(frame: NDArray) -> memoryview:
+        nonlocal encoder, level, render_time
+        started: float = time.perf_counter()
+        width, height = os.get_terminal_size()
+        cells: NDArray = shades
+
+        if controller is not None:
+            scale, mode, reduced = controller.quality
+            if reduced and len(shades) > 8: cells = shades[::3]
+            if controller.level != level:
+                # never raise the color depth above what was asked for
+                mode = max(mode, color, key=COLOR_MODES.index)
+                if half and mode == 'none': mode = '16'
+                level, encoder = controller.level, make_encoder(cells, mode, True)
+            width, height = max(1, int(width * scale)), max(1, int(height * scale))
+
+        # `get_cells`, stage by stage
+        if half:
+            # two pixel rows per cell, no glyph to pick
+            mapper: CellMapper = cell_mapper(1, _grayscale)
+            pixels: NDArray = timed('resize', mapper.resize, frame, (width, 2 * height))
+            indices: NDArray | int = 0
+        else:
+            mapper: CellMapper = cell_mapper(len(cells), _grayscale)
+            pixels: NDArray = timed('resize', mapper.resize, frame, (width, height))
+            indices: NDArray | int = timed('glyphs', mapper.glyphs, timed('grayscale', mapper.grayscale, pixels))
 
         r, g, b = get_rgb_uint8(pixels)
+        output: memoryview = timed('encode', encoder.encode, r, g, b, indices)
+        render_time = time.perf_counter() - started
+        return output
+
+    def write(output: bytes | memoryview) -> None:
+        started: float = time.perf_counter()
+        timed('write', echo_bytes, output)
+        if controller is not None:
+            elapsed: float = time.perf_counter() - started
+            # pipelined stages overlap, the slower one sets the pace
+            controller.update(max(elapsed, render_time) if pipeline else elapsed + render_time)
 
-        colored_chars: NDArray = add_ansi(r, g, b, chars)
-        output: str = join(colored_chars)
-
-        echo(output)
-
-    cap.release()
     os.system('cls' if os.name == 'nt' else 'clear')
 
+    try:
+        if pipeline:
+            # the encoder reuses its buffer, so hand a copy to the output thread
+            pipe: Pipeline = Pipeline(read, lambda frame: bytes(render(frame)), write,
+                                      drop=isinstance(camera, int))
+            pipe.run()
 
-webcam = echo_video
-
-
-def play(shade: Literal['solid', 'ascii', 'dot'], url: str, delete: bool = True) -> None:
-    if not os.path.exists(url):
-        output_path: str = download(url=url, res='worst', output_path=None, open=False)
-    else:
-        output_path = url
-    echo_video(shade, _grayscale='mean', camera=output_path)
-    if delete: os.remove(output_path)
+        else:
+            while (frame := read()) is not None:
+                write(render(frame))
 
-    os.system('cls' if os.name == 'nt' else 'clear')
+    finally:
+        cap.release()
+        os.system('cls' if os.name == 'nt' else 'clear')
 
+        if pipeline:
+            print(f'Dropped frames: {pipe.dropped}')
+        if profiler is not None:
+            profiler.finish()
 
-def donut(ai: float = .04, bi: float = .08, speed: float = .03) -> None:
-    '''https://www.a1k0n.net/2011/07/20/donut-math.html'''
 
+webcam = echo_video
 
-    theta_spacing: float = .07
-    phi_spacing:   float = .02
+VIDEO_STAGES: tuple = ('read', 'resize', 'grayscale', 'glyphs', 'encode', 'write')
+
+COLOR_MODES: tuple = ('truecolor', '256', '16', 'none')
+
+
+def play(
+    shade: Literal['solid', 'ascii', 'dot', 'half'],
+    url: str,
+    delete: bool = True,
+    delta: bool = False,
+    tolerance: int = 0,
+    pipeline: bool = False,
+    speed: float = 1.0,
+    start: float = 0.0,
+    stream: bool = False,
+    buffer: float = 2.0,
+    color: ColorMode = 'truecolor',
+    dither: bool = False,
+    target_fps: float | None = None,
+    profile: bool = False,
+    profile_out: str | None = None,
+    trace: str | None = None,
+    render_ahead: bool = False,
+    workers: int | None = None
+) -> None:
 
-    R1, R2, K2 = 1, 2, 5
+    '''With `stream` the video is played while it downloads, starting after
+    `buffer` seconds are decoded, and nothing is written to disk.
+    Files made by `apollo render` (.apf) are replayed without decoding.
+
+    Youtube videos are played from the media cache when they are in it and
+    downloaded into it otherwise; `delete` leaves cached files to eviction.
+
+    `render_ahead` decodes and renders on `workers` processes instead, see
+    `ahead.play`. It needs a file, delta encoding and `target_fps` do not
+    apply.'''
+
+    # pytube and yt_dlp are slow to import, only pay for them here
+    from .download import download, stream_url, cache_lookup, cached_download
+
+    if url.endswith('.apf') and os.path.exists(url):
+        from .apf import play as play_apf
+        play_apf(url, tolerance, speed, start, color, dither)
+        if delete: os.remove(url)
+        return
+
+    if os.path.exists(url):
+        output_path: str = url
+    elif (cached := cache_lookup(url, res='worst')) is not None:
+        output_path, delete = cached, False
+    elif stream:
+        output_path: str = stream_url(url, res='worst')
+    elif (cached := cached_download(url, res='worst')) is not None:
+        output_path, delete = cached, False
+    else:
+        output_path: str = download(url=url, res='worst', output_path=None, open=False)
 
-    # Calculate K1 based on screen size: the maximum x-distance occurs
-    # roughly at the edge of the torus, which is at x=R1+R2, z=0.  we
-    # want that to be displaced 3/8ths of the width of the screen, which
-    # is 3/4th of the way from the center to the side of the screen.
-    # width*3/8 = K1*(R1+R2)/(K2+0)
-    # width*K2*3/(8*(R1+R2)) = K1
-    #K1: float = width * K2 * 3 / (8 * (R1 + R2)) - 15
-    K1 = 25
+    if render_ahead:
+        if not os.path.exists(output_path):
+            raise ValueError('Render-ahead needs a video file, it cannot play a stream.')
+        from .ahead import play as play_ahead
+        play_ahead(output_path, shade, 'mean', speed, start, color, dither, workers,
+                   profile=profile, profile_out=profile_out, trace=trace)
+    else:
+        echo_video(shade, _grayscale='mean', camera=output_path, delta=delta, tolerance=tolerance,
+                   pipeline=pipeline, speed=speed, start=start, buffer=buffer if stream else 0.0,
+                   color=color, dither=dither, target_fps=target_fps,
+                   profile=profile, profile_out=profile_out, trace=trace)
+    # both players clear the screen themselves before their report, a clear
+    # here would erase the dropped frame count and the --profile summary
+    if delete and os.path.exists(output_path): os.remove(output_path)
+
+
+LUMINANCE_RAMP: str = '.,-~:;=!*#$@'
+
+
+class Donut:
+    '''https://www.a1k0n.net/2011/07/20/donut-math.html
+
+    Vectorized version of donut.c: the theta/phi grid and its trig tables are
+    computed once, every frame is one matrix product over all the points of
+    the torus followed by a scatter-max into a reused z-buffer.'''
+
+    def __init__(
+        self,
+        theta_spacing: float = .07,
+        phi_spacing: float = .02,
+        R1: float = 1,
+        R2: float = 2,
+        K2: float = 5,
+        K1: float = 25
+    ) -> None:
+
+        # theta goes around the cross-sectional circle of a torus, phi goes
+        # around the center of revolution of a torus
+        theta, phi = np.meshgrid(np.arange(0, 2*pi, theta_spacing),
+                                 np.arange(0, 2*pi, phi_spacing), indexing='ij')
+        costheta, sintheta = np.cos(theta).ravel(), np.sin(theta).ravel()
+        cosphi,   sinphi   = np.cos(phi).ravel(),   np.sin(phi).ravel()
+
+        # the x,y coordinate of the circle, before revolving
+        circlex: NDArray = R2 + R1 * costheta
+        circley: NDArray = R1 * sintheta
+
+        # every term of x, y, z and the luminance is one of these, times a
+        # product of sines and cosines of A and B (see `coefficients`)
+        self.terms: NDArray = np.stack([
+            circlex * cosphi,
+            circlex * sinphi,
+            circley,
+            cosphi * costheta,
+            costheta * sinphi,
+            sintheta,
+            np.ones_like(circlex),
+        ])
+
+        self.K1: float = K1
+        self.K2: float = K2
+        self.ramp: NDArray = np.frombuffer(LUMINANCE_RAMP.encode(), dtype=np.uint8)
+
+        self._xyzl:  NDArray = np.empty((4, self.terms.shape[1]))
+        self._shape: tuple[int, int] | None = None
+        self._chars: NDArray | None = None
+
+    def coefficients(self, a: float, b: float) -> NDArray:
+        cosA, sinA, cosB, sinB = cos(a), sin(a), cos(b), sin(b)
+        return np.array([
+            # final 3D (x, y, z) coordinate after rotations
+            [cosB,  sinA * sinB,  -cosA * sinB, 0,    0,                  0,                  0],
+            [sinB, -sinA * cosB,   cosA * cosB, 0,    0,                  0,                  0],
+            [0,     cosA,          sinA,        0,    0,                  0,                  self.K2],
+            # luminance, ugly but correct
+            [0,     0,             0,           sinB, -cosA - cosB * sinA, cosB * cosA - sinA, 0],
+        ])
+
+    def render_frame(self, a: float, b: float, width: int, height: int) -> memoryview:
+        if self._shape != (width, height):
+            self._shape = (width, height)
+            self._chars = np.empty(width * height, dtype=np.uint8)
+        self._chars.fill(ord(' '))
+
+        x, y, z, luminance = np.matmul(self.coefficients(a, b), self.terms, out=self._xyzl)
+        ooz: NDArray = 1 / z  # 'one over' z
+
+        # x and y projection. note that y is negated here, because y goes up
+        # in 3D space but down on 2D displays.
+        xprojection: NDArray = (width  / 2 + self.K1 * ooz * x).astype(np.intp)
+        yprojection: NDArray = (height / 2 - self.K1 * ooz * y).astype(np.intp)
+
+        # L ranges from -sqrt(2) to +sqrt(2). If it's < 0, the surface is
+        # pointing away from us, so we won't bother trying to plot it.
+        visible: NDArray = (luminance > 0) & \
+            (0 <= xprojection) & (xprojection < width) & (0 <= yprojection) & (yprojection < height)
+
+        cells: NDArray = (yprojection * width + xprojection)[visible]
+        ooz, luminance = ooz[visible], luminance[visible]
+
+        # z-buffer as a scatter-max: sort by cell then depth and keep the last
+        # point of every cell, larger 1/z means closer to the viewer.
+        order: NDArray = np.lexsort((ooz, cells))
+        cells = cells[order]
+        nearest: NDArray = np.ones(cells.size, dtype=bool)
+        nearest[:-1] = cells[1:] != cells[:-1]
+
+        # luminance * 8 is in the range 0..11 (8*sqrt(2) = 11.3)
+        luminance_index: NDArray = (luminance[order][nearest] * 8).astype(np.intp)
+        self._chars[cells[nearest]] = self.ramp[luminance_index]
+
+        return memoryview(self._chars)
+
+
+def donut(
+    ai: float = .04,
+    bi: float = .08,
+    speed: float = .03,
+    profile: bool = False,
+    profile_out: str | None = None,
+    trace: str | None = None
+) -> None:
+    '''https://www.a1k0n.net/2011/07/20/donut-math.html'''
 
-    def render_frame(a: float, b: float) -> None:
-        width, height = os.get_terminal_size()
-        # precompute sines and cosines of A and B
-        cosA: float = cos(a)
-        sinA: float = sin(a)
-        cosB: float = cos(b)
-        sinB: float = sin(b)
-
-        output:  list = [[' ' for _ in range(width)] for _ in range(height)]
-        zbuffer: list = [[0.0 for _ in range(width)] for _ in range(height)]
-
-        # theta goes around the cross-sectional circle of a torus
-        for theta in np.arange(0, 2*pi, theta_spacing):
-
-            # precompute sines and cosines of theta
-            costheta: float = cos(theta)
-            sintheta: float = sin(theta)
-
-            # phi goes around the center of revolution of a torus
-            for phi in np.arange(0, 2*pi, phi_spacing):
-
-                # precompute sines and cosines of phi
-                cosphi: float = cos(phi)
-                sinphi: float = sin(phi)
-
-                # the x,y coordinate of the circle, before revolving (factored
-                # out of the above equations)
-                circlex: float = R2 + R1 * costheta
-                circley: float = R1 * sintheta
-
-                # final 3D (x,y,z) coordinate after rotations, directly from
-                # our math above
-                x: float = circlex * (cosB * cosphi + sinA * sinB * sinphi) - circley * cosA * sinB
-                y: float = circlex * (sinB * cosphi - sinA * cosB * sinphi) + circley * cosA * cosB
-                z: float = K2 + cosA * circlex * sinphi + circley * sinA
-
-                ooz: float = 1/z # 'one over' z
-
-                # x and y projection. note that y is negated here, because y
-                # goes up in 3D space but down on 2D displays.
-                xprojection: int = int(width / 2 + K1 * ooz * x)
-                yprojection: int = int(height / 2 - K1 * ooz * y)
-
-                # calculate luminance.  ugly, but correct.
-                luminance: float = cosphi * costheta * sinB - cosA * costheta * sinphi - \
-                    sinA * sintheta + cosB * (cosA * sintheta - costheta * sinA * sinphi)
-
-                # L ranges from -sqrt(2) to +sqrt(2). If it's < 0, the surface
-                # is pointing away from us, so we won't bother trying to plot it.
-                if not (luminance > 0):
-                    continue
-
-                if not (0 <= xprojection < width and 0 <= yprojection < height):
-                    continue
-
-                # test against the z-buffer. larger 1/z means the pixel is
-                # closer to the viewer than what's already plotted.
-                if not (ooz > zbuffer[yprojection][xprojection]):
-                    continue
-
-                zbuffer[yprojection][xprojection] = ooz
-                luminance_index: int = int(luminance * 8)
-
-                # luminance_index is now in the range 0..11 (8*sqrt(2) = 11.3)
-                # now we lookup the character corresponding to the
-                # luminance and plot it in our output:
-                output[yprojection][xprojection] = '.,-~:;=!*#$@'[luminance_index]
-
-        # now, dump output[] to the screen.
-        # bring cursor to "home" location, in just about any currently-used
-        # terminal emulation mode
-        #os.system('cls' if os.name == 'nt' else 'clear')
-        echo(''.join(''.join(row) for row in output))
+    engine: Donut = Donut()
+    profiler: Profiler | None = Profiler.from_options(('render', 'write'), profile, profile_out, trace)
+    timed = profiler if profiler is not None else untimed
 
     a, b = 0, 0
-    while True:
-        render_frame(a, b)
-        a += ai
-        b += bi
-
-        time.sleep(speed)
\ No newline at end of file
+    try:
+        while True:
+            width, height = os.get_terminal_size()
+            timed('write', echo_bytes, timed('render', engine.render_frame, a, b, width, height))
+            a += ai
+            b += bi
+
+            time.sleep(speed)
+
+    finally:
+        if profiler is not None:
+            profiler.finish()
@@ -0,0 +1,244 @@
+# bench.py
+# Renderer benchmarks on synthetic input, no webcam or video needed
+
+from __future__ import annotations
+
+import json
+import numpy as np
+import time
+
+from collections import defaultdict
+from numpy.typing import NDArray
+from typing import Any, Callable, Iterator, Literal
+
+from . import ascii as _ascii
+from .ansi import FrameEncoder, DeltaEncoder, HalfBlockEncoder, HalfDeltaEncoder
+from .graph import echo_graph
+
+
+SCENES: tuple = ('noise', 'gradient', 'static')
+SHADES: tuple = ('ascii', 'solid', 'dot', 'half')
+GRAYSCALES: tuple = ('default', 'mean')
+COLORS: tuple = ('truecolor', '256', '16', 'none')
+SIZES: tuple = ((80, 24), (120, 40), (200, 60))
+
+
+class NullSink:
+    '''Swallows everything, counting the bytes written'''
+
+    def __init__(self) -> None:
+        self.written: int = 0
+
+    def write(self, buffer: Any) -> int:
+        self.written += len(buffer)
+        return len(buffer)
+
+    def flush(self) -> None:
+        pass
+
+
+class Stopwatch:
+    '''Accumulates `perf_counter_ns` timings per stage'''
+
+    def __init__(self) -> None:
+        self.ns: dict[str, int] = defaultdict(int)
+
+    def __call__(self, stage: str, fn: Callable, *args: Any) -> Any:
+        start: int = time.perf_counter_ns()
+        result: Any = fn(*args)
+        self.ns[stage] += time.perf_counter_ns() - start
+        return result
+
+    def ms(self, frames: int) -> dict[str, float]:
+        '''Mean milliseconds per frame of every stage'''
+        return {stage: ns / frames / 1e6 for stage, ns in self.ns.items()}
+
+
+def synthetic_frames(
+    scene: Literal['noise', 'gradient', 'static'],
+    count: int,
+    shape: tuple[int, int] = (480, 640),
+    seed: int = 0
+) -> Iterator[NDArray]:
+
+    '''BGR frames: pure noise, a scrolling color gradient, or a still
+    picture with a small moving square (what a webcam on a desk looks like)'''
+
+    height, width = shape
+    rng = np.random.default_rng(seed)
+
+    if scene == 'noise':
+        for _ in range(count):
+            yield rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+    elif scene == 'gradient':
+        x: NDArray = np.linspace(0, 255, width)[None, :]
+        y: NDArray = np.linspace(0, 255, height)[:, None]
+        for i in range(count):
+            frame: NDArray = np.empty((height, width, 3), dtype=np.uint8)
+            frame[..., 0] = (x + 4 * i) % 256
+            frame[..., 1] = (y + 2 * i) % 256
+            frame[..., 2] = (x + y) / 2
+            yield frame
+
+    elif scene == 'static':
+        still: NDArray = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        side: int = min(height, width) // 8
+        for i in range(count):
+            frame: NDArray = still.copy()
+            left: int = (8 * i) % (width - side)
+            frame[height // 2:height // 2 + side, left:left + side] = 255
+            yield frame
+
+    else:
+        raise ValueError(f'Unknown scene: {scene}')
+
+
+def bench_video(
+    scene: str,
+    size: tuple[int, int],
+    shade: str,
+    _grayscale: str,
+    frames: int = 30,
+    color: str = 'truecolor'
+) -> dict:
+
+    '''Times every stage of `echo_video` on synthetic frames. The legacy
+    `add_ansi` + `join` path is timed next to the byte encoder, fps and
+    bytes/frame are those of the encoder path. Half blocks have no glyphs
+    and no legacy path, they resize to two pixel rows per cell.'''
+
+    half: bool = shade == 'half'
+    shades: NDArray = _ascii.get_shades(shade)
+    mapper: _ascii.CellMapper = _ascii.CellMapper(1 if half else len(shades), _grayscale)
+
+    if half:
+        encoder: HalfBlockEncoder = HalfBlockEncoder(color)
+        delta:   HalfDeltaEncoder = HalfDeltaEncoder(color=color)
+        grid:    tuple[int, int]  = (size[0], 2 * size[1])
+    else:
+        encoder: FrameEncoder = FrameEncoder(shades, color)
+        delta:   DeltaEncoder = DeltaEncoder(shades, color=color)
+        grid:    tuple[int, int] = size
+
+    sink:    NullSink     = NullSink()
+    watch:   Stopwatch    = Stopwatch()
+    delta_bytes: int = 0
+
+    for frame in synthetic_frames(scene, frames):
+        pixels: NDArray = watch('resize', mapper.resize, frame, grid)
+        indices: NDArray | int = 0
+        if not half:
+            grayscale: NDArray = watch('grayscale', mapper.grayscale, pixels)
+            indices = watch('ilum_idx', mapper.glyphs, grayscale)
+        r, g, b = watch('rgb', _ascii.get_rgb_uint8, pixels)
+
+        if not half and color == 'truecolor':
+            colored: NDArray = watch('add_ansi', _ascii.add_ansi, r, g, b, shades[indices])
+            watch('join', _ascii.join, colored)
+
+        output: memoryview = watch('encode', encoder.encode, r, g, b, indices)
+        watch('write', sink.write, output)
+
+        delta_bytes += len(watch('delta', delta.encode, r, g, b, indices))
+
+    ms: dict[str, float] = watch.ms(frames)
+    path: float = sum(ms.get(s, 0.0) for s in ('resize', 'grayscale', 'ilum_idx', 'rgb', 'encode', 'write'))
+
+    return {
+        'bench': 'video',
+        'case': f'{scene} {size[0]}x{size[1]} {shade}/{_grayscale} {color}',
+        'fps': 1e3 / path,
+        'bytes_per_frame': sink.written / frames,
+        'delta_bytes_per_frame': delta_bytes / frames,
+        'stages_ms': ms,
+    }
+
+
+def bench_donut(size: tuple[int, int], frames: int = 30) -> dict:
+    engine: _ascii.Donut = _ascii.Donut()
+    sink:   NullSink     = NullSink()
+    watch:  Stopwatch    = Stopwatch()
+
+    for i in range(frames):
+        output: memoryview = watch('render', engine.render_frame, i * .04, i * .08, *size)
+        watch('write', sink.write, output)
+
+    ms: dict[str, float] = watch.ms(frames)
+    return {
+        'bench': 'donut',
+        'case': f'{size[0]}x{size[1]}',
+        'fps': 1e3 / sum(ms.values()),
+        'bytes_per_frame': sink.written / frames,
+        'stages_ms': ms,
+    }
+
+
+def bench_graph(points: int, frames: int = 30) -> dict:
+    x: NDArray = np.linspace(0, 10, points)
+    y: NDArray = np.sin(x)
+    sink:  NullSink  = NullSink()
+    watch: Stopwatch = Stopwatch()
+
+    for _ in range(frames):
+        watch('echo_graph', echo_graph, x, y, None, None, sink)
+
+    ms: dict[str, float] = watch.ms(frames)
+    return {
+        'bench': 'graph',
+        'case': f'{points} points',
+        'fps': 1e3 / sum(ms.values()),
+        'bytes_per_frame': sink.written / frames,
+        'stages_ms': ms,
+    }
+
+
+def run(
+    frames: int = 30,
+    sizes: tuple = SIZES,
+    only: tuple = ('video', 'donut', 'graph')
+) -> list[dict]:
+
+    results: list[dict] = []
+
+    if 'video' in only:
+        for scene in SCENES:
+            for size in sizes:
+                for shade in SHADES:
+                    # half blocks pick no glyph, the grayscale method does not matter
+                    for _grayscale in GRAYSCALES if shade != 'half' else ('mean',):
+                        results.append(bench_video(scene, size, shade, _grayscale, frames))
+                    # the lower color depths with the 'mean' grayscale only
+                    for color in COLORS[1:]:
+                        if shade == 'half' and color == 'none': continue  # half blocks need a color
+                        results.append(bench_video(scene, size, shade, 'mean', frames, color))
+
+    if 'donut' in only:
+        for size in sizes:
+            results.append(bench_donut(size, frames))
+
+    if 'graph' in only:
+        for points in (80, 10_000, 1_000_000):
+            results.append(bench_graph(points, frames))
+
+    return results
+
+
+def format_table(results: list[dict]) -> str:
+    lines: list[str] = []
+    for res in results:
+        stages: str = '  '.join(f'{k} {v:.3f}' for k, v in res['stages_ms'].items())
+        lines.append(
+            f"{res['bench']:<6} {res['case']:<44} {res['fps']:>9.1f} fps "
+            f"{res['bytes_per_frame']:>10.0f} B/frame   ms/frame: {stages}"
+        )
+    return '\n'.join(lines)
+
+
+def main(frames: int, sizes: tuple, only: tuple, as_json: bool) -> None:
+    results: list[dict] = run(frames, sizes or SIZES, only)
+
+    if as_json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_table(results))
@@ -0,0 +1,150 @@
+# cache.py
+# Downloaded videos kept between runs, keyed by youtube video id and resolution
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+
+from platformdirs import user_cache_dir
+from typing import Literal
+
+from .config import get as config_get, read_json, write_json
+
+
+CACHE_DIR:  str = os.path.join(user_cache_dir('apollo'), 'media')
+INDEX_NAME: str = 'index.json'
+
+# batch downloads update the index from several threads
+_lock: threading.Lock = threading.Lock()
+
+
+def size_limit() -> int:
+    '''`cache-size-limit` from the config, in bytes. 0 turns the cache off.'''
+    try:
+        return int(float(config_get('cache-size-limit')) * 1e6)
+    except (ValueError, TypeError):
+        return 0
+
+
+class MediaCache:
+    '''Video files in `root` plus an index mapping `<video id>-<res>` to the
+    file, its size and when it was last used. Adding a file evicts the least
+    recently used ones until the total fits in `limit` bytes.
+
+    Every operation re-reads the index and writes it back atomically under
+    a thread lock, so the threads of one process stay consistent. Separate
+    processes never see a torn index, but one can overwrite an update the
+    other made at the same moment.'''
+
+    def __init__(self, root: str = CACHE_DIR, limit: int | None = None) -> None:
+        self.root:  str = root
+        self.limit: int = size_limit() if limit is None else limit
+        self.index_path: str = os.path.join(root, INDEX_NAME)
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    @staticmethod
+    def key(video: str, res: Literal['best', 'worst']) -> str:
+        return f'{video}-{res}'
+
+    def _load(self) -> dict[str, dict]:
+        return read_json(self.index_path) or {}  # the files are re-indexed as they come back
+
+    def _save(self, index: dict[str, dict]) -> None:
+        write_json(self.index_path, index, indent=2)
+
+    def get(self, video: str, res: Literal['best', 'worst']) -> str | None:
+        '''Path of the cached file, marking it as just used'''
+        key: str = self.key(video, res)
+        with _lock:
+            index: dict[str, dict] = self._load()
+            entry: dict | None = index.get(key)
+            if entry is None: return None
+
+            path: str = os.path.join(self.root, entry['file'])
+            if not os.path.exists(path) or os.path.getsize(path) != entry['size']:
+                del index[key]
+                self._save(index)
+                return None
+
+            entry['used'] = time.time()
+            self._save(index)
+            return path
+
+    def put(self, video: str, res: Literal['best', 'worst'], source: str, move: bool = False) -> str:
+        '''Adds `source` to the cache, moved or else hard linked (copied when
+        linking fails), and returns the cached path'''
+        key: str = self.key(video, res)
+        filename: str = f'{key}{os.path.splitext(source)[1] or ".mp4"}'
+        path: str = os.path.join(self.root, filename)
+        os.makedirs(self.root, exist_ok=True)
+
+        if os.path.abspath(source) != os.path.abspath(path):
+            if move:
+                shutil.move(source, path)
+            else:
+                if os.path.exists(path): os.remove(path)
+                try:
+                    os.link(source, path)
+                except OSError:
+                    shutil.copyfile(source, path)
+
+        with _lock:
+            index: dict[str, dict] = self._load()
+            index[key] = {'file': filename, 'size': os.path.getsize(path), 'used': time.time()}
+            self._evict(index, keep=key)
+            self._save(index)
+
+        return path
+
+    def _evict(self, index: dict[str, dict], keep: str) -> None:
+        total: int = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['used']):
+            if total <= self.limit: break
+            if key == keep: continue  # a file over the limit alone still gets played once
+            total -= index[key]['size']
+            self._remove(index.pop(key))
+
+    def _remove(self, entry: dict) -> None:
+        try:
+            os.remove(os.path.join(self.root, entry['file']))
+        except FileNotFoundError:
+            pass
+
+    def entries(self) -> list[tuple[str, dict]]:
+        '''Index entries, most recently used first'''
+        with _lock:
+            index: dict[str, dict] = self._load()
+        return sorted(index.items(), key=lambda item: -item[1]['used'])
+
+    def clear(self) -> tuple[int, int]:
+        '''Deletes every cached file, returns how many and their total size'''
+        with _lock:
+            index: dict[str, dict] = self._load()
+            for entry in index.values():
+                self._remove(entry)
+            self._save({})
+        return len(index), sum(entry['size'] for entry in index.values())
+
+
+def ls() -> None:
+    cache: MediaCache = MediaCache()
+    entries: list[tuple[str, dict]] = cache.entries()
+
+    for key, entry in entries:
+        used: str = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['used']))
+        print(f'{key:<20} {entry["size"] / 1e6:>9.1f} MB   last used {used}')
+
+    total: int = sum(entry['size'] for _, entry in entries)
+    limit: str = f'{cache.limit / 1e6:.0f} MB' if cache.enabled else 'disabled'
+    print(f'{len(entries)} videos, {total / 1e6:.1f} MB (limit {limit}) in {cache.root}')
+
+
+def clear() -> None:
+    count, size = MediaCache().clear()
+    print(f'Removed {count} videos, {size / 1e6:.1f} MB.')
@@ -4,16 +4,13 @@
 from __future__ import annotations
 
 from importlib.metadata import version, PackageNotFoundError
-from typing import List, Literal
+from typing import Callable, List, Literal
 
 import click
 import pathlib
 
-from . import math as _math
-from . import ascii as _ascii
-from . import download as _download
-from . import config as _config
-from . import count_lines as _countlines
+# Subcommands import their modules when they run: cv2, numpy, pytube and
+# yt_dlp take far longer to load than most commands take to finish.
 
 def pkg_version() -> str:
     try:
@@ -24,6 +21,14 @@ def pkg_version() -> str:
     return current_version
 
 
+def profile_options(command: Callable) -> Callable:
+    '''`--profile`, `--profile-out` and `--trace`, for the commands that draw frames'''
+    command = click.option('--trace', type=click.Path(dir_okay=False), default=None, help='Also save a Chrome trace, for chrome://tracing or Perfetto (implies --profile)')(command)
+    command = click.option('--profile-out', type=click.Path(dir_okay=False), default=None, help='Also save the timings as JSON (implies --profile)')(command)
+    command = click.option('--profile', is_flag=True, default=False, help='Time every stage of every frame, print percentiles and FPS on exit')(command)
+    return command
+
+
 @click.group()
 @click.version_option(pkg_version(), prog_name='apollo')
 def main() -> None:
@@ -45,33 +50,83 @@ def main() -> None:
 @click.option('--abs', 'op', flag_value='abs', help='Absolute value of a single number')
 @click.option('--round', 'op', flag_value='round', help='Round a single number to the nearest integer')
 @click.option('--eval', 'op', default=True, flag_value='eval', help='Evaluate the math expression (default)')
+@click.option('--from', 'from_path', default=None, metavar='CSV', help='Evaluate the expression over every row of a CSV file with a header (- for stdin)')
+@click.option('-v', '--var', 'variables', multiple=True, metavar='NAME=VALUE', help='Variable for the expression (repeatable)')
+@click.option('--stats', is_flag=True, default=False, help='Stream the numbers in the given files (stdin if none) and print count, sum, min, max, mean, std and quantiles')
+@click.option('-q', '--quantile', 'quantiles', type=click.FloatRange(0, 1), multiple=True, help='Quantile reported by --stats (repeatable, default 0.5)')
 @click.argument('args', nargs=-1)
-def math(op: str, args: List[str]) -> None:
+def math(
+    op: str, from_path: str | None, variables: tuple, stats: bool, quantiles: tuple, args: List[str]
+) -> None:
     '''Perform math operations on given numbers'''
+    from . import math as _math
     try:
-        result = _math.main(args, operation=op)
+        if stats:
+            from . import stats as _stats
+            for name, value in _stats.summarize(args, quantiles or (.5,)).items():
+                click.echo(f'{name}: {value:,}')
+            return
+
+        values: dict = {name.strip(): float(value) for name, value in (v.split('=', 1) for v in variables)}
+
+        if from_path is not None:
+            _math.evaluate_csv(' '.join(args), from_path, values)
+            return
+
+        result = _math.main(args, operation=op, variables=values)
         click.echo(f'= {result}')
     except Exception as e:
         click.echo(f'Error: {e}', err=True)
 
 
 @main.command()
-@click.option('--shade', type=click.Choice(['solid', 'ascii', 'dot']), default='ascii', show_default=True, help='Shading style')
+@click.option('--shade', type=click.Choice(['solid', 'ascii', 'dot', 'half']), default='ascii', show_default=True, help='Shading style, half draws two pixels per cell')
 @click.option('--grayscale', '_grayscale', type=click.Choice(['mean', 'default']), default='default', show_default=True, help='Grayscale method')
 @click.option('--cam', 'camera', type=int, default=0, show_default=True, help='Camera index')
-def webcam(shade: str, _grayscale: str, camera: int) -> None:
+@click.option('--delta', is_flag=True, default=False, help='Only redraw the cells that changed')
+@click.option('--tolerance', type=click.IntRange(0, 255), default=0, show_default=True, help='Color change ignored by --delta')
+@click.option('--pipeline', is_flag=True, default=False, help='Capture, render and write on separate threads, dropping stale frames')
+@click.option('--color', type=click.Choice(['truecolor', '256', '16', 'none']), default='truecolor', show_default=True, help='Color depth of the output')
+@click.option('--dither', is_flag=True, default=False, help='Ordered dithering for the 256 and 16 color modes')
+@click.option('--target-fps', type=click.FloatRange(0, min_open=True), default=None, help='Lower grid size, colors and shades as needed to hold this frame rate')
+@profile_options
+def webcam(
+    shade: str, _grayscale: str, camera: int, delta: bool, tolerance: int, pipeline: bool, color: str, dither: bool,
+    target_fps: float | None, profile: bool, profile_out: str | None, trace: str | None
+) -> None:
     '''Displays a live webcam feed as ASCII art in the terminal.'''
-    _ascii.webcam(shade, _grayscale, camera)
+    if shade == 'half' and color == 'none':
+        raise click.UsageError('--shade half draws colored pixels, it cannot be used with --color none')
+
+    from . import ascii as _ascii
+    _ascii.webcam(shade, _grayscale, camera, delta, tolerance, pipeline, color=color, dither=dither, target_fps=target_fps,
+                  profile=profile, profile_out=profile_out, trace=trace)
 
 
 @main.command()
-@click.argument('url')
+@click.argument('urls', nargs=-1)
+@click.option('-i', '--input', 'url_list', type=click.Path(exists=True, dir_okay=False), default=None, help='File with one URL per line')
 @click.option('--output-path', default=None, help='Optional path to save the file')
 @click.option('--res', default='best', type=click.Choice(['best', 'worst']), show_default=True, help='Video resolution')
 @click.option('-o', '--open', is_flag=True, default=False, help='Open video after download')
-def download(url: str, output_path: str, res: str, open: bool) -> None:
-    '''Download youtube video from a given URL'''
-    _download.download(url, output_path, res, open)
+@click.option('-j', '--jobs', type=click.IntRange(1), default=4, show_default=True, help='Parallel downloads for several URLs')
+@click.option('--retries', type=click.IntRange(0), default=3, show_default=True, help='Retries of a failed download')
+def download(urls: tuple[str, ...], url_list: str | None, output_path: str, res: str, open: bool, jobs: int, retries: int) -> None:
+    '''Download youtube videos from the given URLs'''
+    from . import download as _download
+
+    if url_list is not None:
+        urls += tuple(_download.read_url_list(url_list))
+    if not urls:
+        raise click.UsageError('Give at least one URL or an --input file.')
+
+    if len(urls) == 1 and url_list is None:
+        _download.download(urls[0], output_path, res, open)
+        return
+
+    if open:
+        raise click.UsageError('--open only works with a single URL.')
+    _download.download_batch(urls, output_path, res, jobs, retries)
 
 
 @main.command()
@@ -81,6 +136,7 @@ def download(url: str, output_path: str, res: str, open: bool) -> None:
 @click.argument('value', required=False)
 def config(show: bool, set_mode: bool, parameter: str | None, value: str | None) -> None:
     '''View or update configuration.'''
+    from . import config as _config
 
     if show:
         _config.show(parameter)
@@ -94,28 +150,148 @@ def config(show: bool, set_mode: bool, parameter: str | None, value: str | None)
         raise click.UsageError("You must use either --show or --set")
 
 
+@main.group()
+def cache() -> None:
+    '''Manage the cache of downloaded videos (size limit: `apollo config --set cache-size-limit <MB>`).'''
+    pass
+
+
+@cache.command('ls')
+def cache_ls() -> None:
+    '''List the cached videos, most recently used first.'''
+    from . import cache as _cache
+    _cache.ls()
+
+
+@cache.command('clear')
+def cache_clear() -> None:
+    '''Delete every cached video.'''
+    from . import cache as _cache
+    _cache.clear()
+
+
 @main.command()
 @click.argument('url')
-@click.option('--shade', type=click.Choice(['solid', 'ascii', 'dot']), default='ascii', show_default=True, help='Shading style')
-@click.option('-d', '--delete', is_flag=True, default=False, help='Delete video after run')
-def play(url: str, shade: str, delete: bool) -> None:
-    '''Displays a youtube video as ASCII art in the terminal.'''
-    _ascii.play(shade, url, delete)
+@click.option('--shade', type=click.Choice(['solid', 'ascii', 'dot', 'half']), default='ascii', show_default=True, help='Shading style, half draws two pixels per cell')
+@click.option('-d', '--delete', is_flag=True, default=False, help='Delete video after run (cached videos are left to the cache size limit)')
+@click.option('--delta', is_flag=True, default=False, help='Only redraw the cells that changed')
+@click.option('--tolerance', type=click.IntRange(0, 255), default=0, show_default=True, help='Color change ignored by --delta')
+@click.option('--pipeline', is_flag=True, default=False, help='Decode, render and write on separate threads')
+@click.option('--speed', type=click.FloatRange(0, min_open=True), default=1.0, show_default=True, help='Playback speed multiplier')
+@click.option('--start', type=click.FloatRange(0), default=0.0, show_default=True, help='Start offset in seconds')
+@click.option('--stream', is_flag=True, default=False, help='Play while downloading, nothing is saved')
+@click.option('--buffer', type=click.FloatRange(0), default=2.0, show_default=True, help='Seconds buffered before --stream starts')
+@click.option('--color', type=click.Choice(['truecolor', '256', '16', 'none']), default='truecolor', show_default=True, help='Color depth of the output')
+@click.option('--dither', is_flag=True, default=False, help='Ordered dithering for the 256 and 16 color modes')
+@click.option('--target-fps', type=click.FloatRange(0, min_open=True), default=None, help='Lower grid size, colors and shades as needed to hold this frame rate')
+@click.option('--render-ahead', is_flag=True, default=False, help='Decode and render on several processes ahead of playback (files only, full frames)')
+@click.option('--workers', type=click.IntRange(1), default=None, help='Processes for --render-ahead  [default: number of CPUs]')
+@profile_options
+def play(
+    url: str, shade: str, delete: bool, delta: bool, tolerance: int, pipeline: bool, speed: float, start: float,
+    stream: bool, buffer: float, color: str, dither: bool, target_fps: float | None,
+    render_ahead: bool, workers: int | None, profile: bool, profile_out: str | None, trace: str | None
+) -> None:
+    '''Displays a youtube video (or a file rendered by `apollo render`) as ASCII art in the terminal.'''
+    if render_ahead and stream:
+        raise click.UsageError('--render-ahead needs a file, it cannot be used with --stream')
+    if shade == 'half' and color == 'none':
+        raise click.UsageError('--shade half draws colored pixels, it cannot be used with --color none')
+
+    from . import ascii as _ascii
+    _ascii.play(shade, url, delete, delta, tolerance, pipeline, speed, start, stream, buffer, color, dither, target_fps,
+                profile, profile_out, trace, render_ahead, workers)
 
 
 @main.command()
 @click.option('-a', type=float, default=.04, show_default=True, help='Rotation angle around X-axis')
 @click.option('-b', type=float, default=.08, show_default=True, help='Rotation angle around Y-axis')
 @click.option('--speed', type=float, default=.03, show_default=True, help='Rotation speed. Time between frames.')
-def donut(a: float, b: float, speed: float) -> None:
+@profile_options
+def donut(a: float, b: float, speed: float, profile: bool, profile_out: str | None, trace: str | None) -> None:
     '''donut.c from www.a1k0n.net/2011/07/20/donut-math.html'''
-    _ascii.donut(a, b, speed)
+    from . import ascii as _ascii
+    _ascii.donut(a, b, speed, profile, profile_out, trace)
+
+
+@main.command()
+@click.argument('model', type=click.Path(exists=True, dir_okay=False))
+@click.option('-a', type=float, default=.04, show_default=True, help='Rotation angle around X-axis')
+@click.option('-b', type=float, default=.08, show_default=True, help='Rotation angle around Y-axis')
+@click.option('--speed', type=float, default=.03, show_default=True, help='Rotation speed. Time between frames.')
+@profile_options
+def mesh(model: str, a: float, b: float, speed: float, profile: bool, profile_out: str | None, trace: str | None) -> None:
+    '''Spin a triangle mesh (.obj) like the donut.'''
+    from . import mesh as _mesh
+    _mesh.spin(model, a, b, speed, profile, profile_out, trace)
 
 @main.command()
 @click.argument("dir", type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=pathlib.Path))
 @click.option("-b", "--skip-blank", default=False, is_flag=True, help="Ignore completely blank lines.",)
 @click.option("-c", "--skip-comments", default=False, is_flag=True, help="Ignore lines that begin with # or //.")
 @click.option("-e","--ext","exts",multiple=True,metavar="EXT",help="Additional file extensions to count (e.g. -e .rs -e .go). If omitted, the default list from the library is used.")
-def countlines(dir: str, skip_blank: bool, skip_comments: bool, exts: list = []) -> None:
+@click.option("-j", "--jobs", type=click.IntRange(1), default=None, help="Worker processes. Defaults to the number of CPUs.")
+@click.option("--no-cache", "no_cache", default=False, is_flag=True, help="Read every file instead of reusing the counts of unchanged ones.")
+@click.option("-x", "--exclude", "excludes", multiple=True, metavar="GLOB", help="Skip files and directories matching GLOB, by name or relative path (repeatable).")
+@click.option("--no-ignore", "no_ignore", default=False, is_flag=True, help="Also walk .git, node_modules, venv, build output and .gitignore'd paths.")
+@click.option("--follow-symlinks", default=False, is_flag=True, help="Enter symlinked directories, each directory at most once.")
+def countlines(
+    dir: str, skip_blank: bool, skip_comments: bool, exts: list = [], jobs: int | None = None, no_cache: bool = False,
+    excludes: tuple = (), no_ignore: bool = False, follow_symlinks: bool = False
+) -> None:
     """Count the number of lines of code in a single directory"""
-    _countlines.main(dir, skip_blank, skip_comments, exts)
\ No newline at end of file
+    from . import count_lines as _countlines
+    _countlines.main(dir, skip_blank, skip_comments, exts, jobs, not no_cache, excludes, not no_ignore, follow_symlinks)
+
+
+def parse_size(ctx: click.Context, param: click.Parameter, value: tuple) -> tuple:
+    try:
+        return tuple(tuple(int(n) for n in v.lower().split('x')) for v in value)
+    except ValueError:
+        raise click.BadParameter('Sizes must look like WIDTHxHEIGHT, e.g. 80x24')
+
+
+@main.command()
+@click.option('-n', '--frames', type=click.IntRange(1), default=30, show_default=True, help='Frames per case')
+@click.option('-s', '--size', 'sizes', multiple=True, callback=parse_size, metavar='WxH', help='Terminal size to bench (repeatable, default 80x24 120x40 200x60)')
+@click.option('--only', multiple=True, type=click.Choice(['video', 'donut', 'graph']), help='Only run these benchmarks')
+@click.option('--json', 'as_json', is_flag=True, default=False, help='Print results as JSON')
+def bench(frames: int, sizes: tuple, only: tuple, as_json: bool) -> None:
+    '''Benchmark the renderers on synthetic frames.'''
+    from . import bench as _bench
+    _bench.main(frames, sizes, only or ('video', 'donut', 'graph'), as_json)
+
+
+@main.command()
+@click.argument('video', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', required=True, type=click.Path(dir_okay=False), help='Output .apf file')
+@click.option('-s', '--size', default=None, metavar='WxH', help='Grid size, the current terminal size by default')
+@click.option('--shade', type=click.Choice(['solid', 'ascii', 'dot']), default='ascii', show_default=True, help='Shading style')
+@click.option('--grayscale', '_grayscale', type=click.Choice(['mean', 'default']), default='mean', show_default=True, help='Grayscale method')
+@click.option('--no-delta', 'no_delta', is_flag=True, default=False, help='Store every frame in full')
+def render(video: str, output: str, size: str | None, shade: str, _grayscale: str, no_delta: bool) -> None:
+    '''Pre-render a video into an .apf file for `apollo play`.'''
+    from . import apf as _apf
+    grid: tuple | None = parse_size(None, None, (size,))[0] if size else None
+    _apf.render(video, output, grid, shade, _grayscale, not no_delta)
+
+
+@main.command()
+@click.argument('source', required=False, type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('-f', '--follow', is_flag=True, default=False, help='Keep reading as the file grows')
+@click.option('--width', type=click.IntRange(1), default=80, show_default=True, help='Plot width')
+@click.option('--height', type=click.IntRange(2), default=12, show_default=True, help='Plot height')
+@click.option('--capacity', type=click.IntRange(1), default=None, help='Samples kept on screen  [default: 8 per column]')
+@click.option('--fps', type=click.FloatRange(0, min_open=True), default=20, show_default=True, help='Maximum redraws per second')
+@click.option('--dtype', default=None, help='Plot SOURCE as raw binary values of this NumPy dtype (e.g. float32)')
+@click.option('--braille', is_flag=True, default=False, help='2x4 dots per character, for .npy and --dtype inputs')
+def graph(
+    source: str | None, follow: bool, width: int, height: int, capacity: int | None, fps: float,
+    dtype: str | None, braille: bool
+) -> None:
+    '''Live plot of the numbers read from a file or stdin, or a static plot of a .npy/binary series.'''
+    from . import graph as _graph
+    if source is not None and (source.endswith('.npy') or dtype is not None):
+        _graph.plot_file(source, dtype, width, height, braille)
+    else:
+        _graph.live(None if source in (None, '-') else source, follow, width, height, capacity, fps)
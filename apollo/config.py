@@ -13,13 +13,48 @@ from platformdirs import user_config_dir
 config_dir = user_config_dir('apollo')
 config_path = os.path.join(config_dir, 'config.json')
 
-os.makedirs(config_dir, exist_ok=True)
+DEFAULTS: dict = {
+    "download-output-path": "None",
+    "cache-size-limit": "2000",  # MB, 0 disables the media cache
+}
+
+
+def read_json(path: str) -> Any:
+    '''Contents of a JSON file, None when it is missing or corrupt'''
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: str, data: Any, **kwargs: Any) -> None:
+    '''Writes `data` next to `path` and renames it over, so a reader never
+    sees half a file. `kwargs` go to `json.dump`.'''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp: str = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp, path)
+
+
+def ensure() -> None:
+    '''Creates the default config file, on first use rather than on import,
+    and adds the parameters an older file does not have yet'''
+    if os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            json_dict: dict = json.load(f)
+        if DEFAULTS.keys() <= json_dict.keys(): return
+    else:
+        json_dict: dict = {}
 
-if not os.path.exists(config_path):
+    os.makedirs(config_dir, exist_ok=True)
     with open(config_path, 'w') as f:
-        json.dump({"download-output-path": "None"}, f)
+        json.dump({**DEFAULTS, **json_dict}, f, indent=2, ensure_ascii=False)
+
 
 def show(parameter: str | None) -> None:
+    ensure()
     with open(config_path, 'r') as file:
         json_dict: dict = json.load(file)
 
@@ -35,6 +70,7 @@ def show(parameter: str | None) -> None:
 
 
 def get(parameter: str) -> Any:
+    ensure()
     with open(config_path, 'r') as file:
         json_dict: dict = json.load(file)
 
@@ -45,6 +81,7 @@ def get(parameter: str) -> Any:
 
 
 def cset(parameter: str, value: Any) -> None:
+    ensure()
     with open(config_path, 'r') as file:
         json_dict: dict = json.load(file)
 
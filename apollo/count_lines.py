@@ -3,7 +3,14 @@
 
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from platformdirs import user_cache_dir
 
+from .config import read_json, write_json
+
+import fnmatch
+import mmap
 import os
 import re
 import typing as t
@@ -12,31 +19,412 @@ DEFAULT_EXTS: tuple = (
     ".py", ".c", ".cpp", ".h", ".hpp", ".java", ".js", ".ts",
     )
 
-def iter_source_files(root: Path, exts: t.Iterable[str]) -> t.Iterable[Path]:
+CACHE_PATH: str = os.path.join(user_cache_dir("apollo"), "countlines.json")
+
+# directories that hold no source of the repo itself
+DEFAULT_EXCLUDES: tuple = (
+    ".git", ".hg", ".svn", "node_modules", "venv", ".venv", "__pycache__",
+    ".tox", ".nox", ".mypy_cache", ".pytest_cache", "build", "dist", "*.egg-info",
+    )
+
+
+def _glob_regex(pattern: str) -> str:
+    """Regex for a gitignore glob: `*` and `?` stop at `/`, `**/` is any
+    number of directories and a trailing `/**` everything inside"""
+    out: list[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?"); i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*"); i += 3
+        elif c == "*":
+            while i < n and pattern[i] == "*": i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]"); i += 1
+        elif c == "[" and (j := pattern.find("]", i + 2)) != -1:
+            body: str = pattern[i + 1:j].replace("\\", "\\\\")
+            out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]"); i = j + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1])); i += 2
+        else:
+            out.append(re.escape(c)); i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    """The rules of one .gitignore, compiled once. `match` takes a path
+    relative to the walk root and returns True (ignored), False (re-included
+    by a `!` rule) or None when no rule applies."""
+
+    def __init__(self, base: str, lines: t.Iterable[str]) -> None:
+        self.base: str = base  # directory of the file, relative, "" or ending in "/"
+
+        rules: list[tuple[bool, bool, str]] = []
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#"): continue
+            if not line.endswith("\\ "): line = line.rstrip(" ")
+
+            negate: bool = line.startswith("!")
+            if negate: line = line[1:]
+            dir_only: bool = line.endswith("/")
+            line = line.rstrip("/")
+            if not line: continue
+
+            # a slash anywhere but at the end anchors the pattern to `base`
+            regex: str = _glob_regex(line.lstrip("/"))
+            rules.append((negate, dir_only, regex if "/" in line else "(?:.*/)?" + regex))
+
+        self.negates: bool = any(negate for negate, _, _ in rules)
+        if self.negates:
+            # last matching rule wins
+            self._rules = [(negate, dir_only, re.compile(r)) for negate, dir_only, r in reversed(rules)]
+        else:
+            # nothing to re-include: one regex for files, one for directories
+            self._files = re.compile("|".join(f"(?:{r})" for _, d, r in rules if not d) or "(?!)")
+            self._dirs  = re.compile("|".join(f"(?:{r})" for _, _, r in rules) or "(?!)")
+
+    @classmethod
+    def read(cls, path: str, base: str) -> "GitIgnore":
+        with open(path, "r", encoding="utf-8", errors="replace") as fh:
+            return cls(base, fh)
+
+    def match(self, rel: str, is_dir: bool) -> bool | None:
+        rel = rel[len(self.base):]
+        if not self.negates:
+            return True if (self._dirs if is_dir else self._files).fullmatch(rel) else None
+        for negate, dir_only, regex in self._rules:
+            if dir_only and not is_dir: continue
+            if regex.fullmatch(rel): return not negate
+        return None
+
+
+def ignored(rules: tuple[GitIgnore, ...], rel: str, is_dir: bool) -> bool:
+    """The deepest .gitignore with a rule for `rel` decides"""
+    for rules_of_dir in reversed(rules):
+        verdict: bool | None = rules_of_dir.match(rel, is_dir)
+        if verdict is not None: return verdict
+    return False
+
+
+def compile_globs(globs: t.Iterable[str]) -> t.Callable[[str], t.Any]:
+    globs = list(globs)
+    if not globs: return lambda name: None
+    return re.compile("|".join(fnmatch.translate(g) for g in globs)).match
+
+
+def suffix(name: str) -> str:
+    """`Path(name).suffix` without building a Path"""
+    i: int = name.rfind(".")
+    return name[i:] if 0 < i < len(name) - 1 else ""
+
+
+def iter_source_files(
+    root: Path,
+    exts: t.Iterable[str],
+    excludes: t.Iterable[str] = (),
+    ignore: bool = True,
+    follow_symlinks: bool = False
+) -> t.Iterable[Path]:
+
+    """Source files under `root`, in `os.walk` order, with `os.scandir`.
+
+    Directories named in `DEFAULT_EXCLUDES` or matched by .gitignore files
+    are never entered (`ignore=False` walks them), `excludes` globs drop
+    files and directories by name or by path relative to `root`. Only the
+    files kept become `Path` objects. Symlinked directories are entered with
+    `follow_symlinks`, each directory at most once, so links cannot loop."""
+
     exts = {e.lower() for e in exts}
-    for path, _, files in os.walk(root):
-        for file in files:
-            if Path(file).suffix.lower() in exts:
-                yield Path(path) / file
+    default: t.Callable = compile_globs(DEFAULT_EXCLUDES if ignore else ())
+    excluded: t.Callable = compile_globs(excludes)
 
-_comment_rx = re.compile(r"^\s*(#|//)")  # crude but works for most
+    st: os.stat_result = os.stat(root)
+    seen: set[tuple[int, int]] = {(st.st_dev, st.st_ino)}
 
-def count_file_lines(path: Path, skip_blank: bool = False, skip_comments: bool = False) -> int:
-    n: int = 0
-    try:
-        with path.open("r", encoding="utf-8", errors="ignore") as fh:
-            for line in fh:
-                if skip_blank and not line.strip():
+    stack: list[tuple[str, str, tuple[GitIgnore, ...]]] = [(os.fspath(root), "", ())]
+    while stack:
+        path, rel, rules = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries: list[os.DirEntry] = list(it)
+        except OSError:
+            continue  # os.walk skips unreadable directories too
+
+        if ignore:
+            for entry in entries:
+                if entry.name == ".gitignore" and entry.is_file():
+                    rules = rules + (GitIgnore.read(entry.path, rel),)
+                    break
+
+        subdirs: list[tuple[str, str, tuple[GitIgnore, ...]]] = []
+        for entry in entries:
+            name: str = entry.name
+            try:
+                is_dir: bool = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                if default(name) or excluded(name) or excluded(rel + name) or \
+                   (rules and ignored(rules, rel + name, True)):
+                    continue
+                if follow_symlinks:
+                    st = entry.stat()
+                    if (st.st_dev, st.st_ino) in seen: continue  # reached again through a link
+                    seen.add((st.st_dev, st.st_ino))
+                elif entry.is_symlink():
                     continue
-                if skip_comments and _comment_rx.match(line):
+                subdirs.append((entry.path, rel + name + "/", rules))
+
+            elif suffix(name).lower() in exts:
+                if excluded(name) or excluded(rel + name) or (rules and ignored(rules, rel + name, False)):
                     continue
-                n += 1
+                yield Path(entry.path)
+
+        # os.walk order: this directory's files, then each subdirectory in turn
+        stack.extend(reversed(subdirs))
+
+_comment_rx = re.compile(r"^\s*(#|//)")
+
+@lru_cache(maxsize=None)
+def _whitespace() -> "np.ndarray":
+    """Bytes str.strip() removes in the ascii range, as a lookup table"""
+    import numpy as np
+    table: np.ndarray = np.zeros(256, dtype=bool)
+    table[[9, 10, 11, 12, 13, 28, 29, 30, 31, 32]] = True
+    return table
+
+MMAP_THRESHOLD: int = 1 << 20
+MMAP_SLICE:     int = 1 << 24
+
+
+def _has_text(tail: bytes) -> bool:
+    """Whether an unterminated last line survives utf-8 decoding with errors
+    ignored, text mode drops one made only of undecodable bytes"""
+    return bool(tail) and (tail[0] < 0x80 or bool(tail.decode("utf-8", errors="ignore")))
+
+
+def count_newlines(data: bytes | mmap.mmap) -> int:
+    """Lines as text mode iteration sees them: `\\n`, `\\r\\n` and a lone `\\r`
+    all end a line, and so does the end of a non empty file. An mmap has no
+    `count`, it is counted in slices of `MMAP_SLICE` bytes."""
+    n: int = 0
+    for i in range(0, len(data), MMAP_SLICE):
+        part: bytes = data[i:i + MMAP_SLICE]
+        n += part.count(b"\n") + part.count(b"\r") - part.count(b"\r\n")
+        if i and data[i - 1:i + 1] == b"\r\n":
+            n -= 1  # split across two slices
+    if _has_text(data[max(data.rfind(b"\n"), data.rfind(b"\r")) + 1:]):
+        n += 1
+    return n
+
+
+def count_filtered(data: bytes | mmap.mmap, skip_blank: bool, skip_comments: bool) -> int:
+    """Same count as `count_newlines` minus blank and/or comment lines, found
+    with vectorized scans over the raw bytes instead of a regex per line."""
+
+    # numpy only for the filters, plain counts start without it
+    import numpy as np
+
+    if b"\r" in data:
+        data = bytes(data).replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+    arr: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+    if arr.size == 0:
+        return 0
+
+    ends: np.ndarray = np.flatnonzero(arr == 10)
+    if arr[-1] != 10 and _has_text(data[ends[-1] + 1 if ends.size else 0:]):
+        ends = np.append(ends, arr.size)
+    if ends.size == 0:
+        return 0
+    starts: np.ndarray = np.concatenate(([0], ends[:-1] + 1))
+
+    # first non whitespace byte of every line, or the line end when there is none
+    solid: np.ndarray = np.flatnonzero(~_whitespace()[arr])
+    nxt: np.ndarray = np.searchsorted(solid, starts)
+    first: np.ndarray = np.append(solid, arr.size)[nxt]
+    blank: np.ndarray = first >= ends
+
+    comment: np.ndarray = np.zeros(ends.size, dtype=bool)
+    lead:    np.ndarray = np.flatnonzero(~blank)
+    padded:  np.ndarray = np.append(arr, [0, 0])
+    head:    np.ndarray = first[lead]
+    if skip_comments:
+        comment[lead] = (padded[head] == ord("#")) | \
+            ((padded[head] == ord("/")) & (padded[head + 1] == ord("/")))
+
+    # a line led by a non ascii byte can still be blank or a comment to the
+    # text mode loop (U+3000, no-break space, undecodable bytes dropped, as
+    # in `/\xff/`): those few lines are decoded and tested the way it did
+    odd: np.ndarray = (padded[head] >= 0x80) | ((padded[head] == ord("/")) & (padded[head + 1] >= 0x80))
+    for i in lead[odd].tolist():
+        text: str = bytes(arr[starts[i]:ends[i]]).decode("utf-8", errors="ignore")
+        blank[i] = not text.strip()
+        comment[i] = not blank[i] and _comment_rx.match(text) is not None
+
+    n: int = ends.size
+    if skip_blank:
+        n -= int(np.count_nonzero(blank))
+    if skip_comments:
+        n -= int(np.count_nonzero(comment))
+
+    return n
+
+
+def count_file_lines(path: Path, skip_blank: bool = False, skip_comments: bool = False) -> int | None:
+    """Line count of `path`, None (after a warning) when it cannot be read"""
+    n: int | None = None
+    try:
+        with open(path, "rb") as fh:
+            size: int = os.fstat(fh.fileno()).st_size
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size >= MMAP_THRESHOLD else fh.read()
+
+            try:
+                if skip_blank or skip_comments:
+                    n = count_filtered(data, skip_blank, skip_comments)
+                else:
+                    n = count_newlines(data)
+            finally:
+                if isinstance(data, mmap.mmap): data.close()
 
     except Exception as e:
         print(f"⚠️  Could not read {path}: {e}")
     return n
 
 
+def _count_chunk(paths: list[Path], skip_blank: bool, skip_comments: bool) -> list[int | None]:
+    return [count_file_lines(p, skip_blank, skip_comments) for p in paths]
+
+
+def balanced_chunks(paths: list[Path], n: int) -> list[list[Path]]:
+    """Splits `paths` into `n` chunks of about the same total size, largest
+    files first into the lightest chunk."""
+
+    def size(p: Path) -> int:
+        try:
+            return os.path.getsize(p)
+        except OSError:
+            return 0
+
+    chunks: list[list[Path]] = [[] for _ in range(n)]
+    loads:  list[int] = [0] * n
+
+    for p, nbytes in sorted(((p, size(p)) for p in paths), key=lambda kv: kv[1], reverse=True):
+        i: int = loads.index(min(loads))
+        chunks[i].append(p)
+        loads[i] += nbytes
+
+    return [c for c in chunks if c]
+
+
+def count_all(
+    paths: list[Path],
+    skip_blank: bool = False,
+    skip_comments: bool = False,
+    jobs: int | None = None
+) -> dict[Path, int | None]:
+
+    """Line count of every path, spread over `jobs` processes (all cores by
+    default, 1 counts in this process). None marks the unreadable ones."""
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) < 2:
+        return dict(zip(paths, _count_chunk(paths, skip_blank, skip_comments)))
+
+    # a few chunks per worker so one slow chunk does not hold up the rest
+    chunks: list[list[Path]] = balanced_chunks(paths, min(len(paths), jobs * 4))
+    counts: dict[Path, int | None] = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(_count_chunk, chunks, [skip_blank] * len(chunks), [skip_comments] * len(chunks))
+        for chunk, ns in zip(chunks, results):
+            counts.update(zip(chunk, ns))
+
+    return {p: counts[p] for p in paths}
+
+
+class LineCache:
+    """Line counts kept on disk between runs, one table per set of filter
+    options, each entry keyed by path and valid while size and mtime_ns match."""
+
+    def __init__(self, path: str = CACHE_PATH) -> None:
+        self.path: str = path
+        self.tables: dict[str, dict[str, list[int]]] = read_json(path) or {}  # missing or corrupt: start over
+
+    @staticmethod
+    def options(skip_blank: bool, skip_comments: bool) -> str:
+        return f"blank={int(skip_blank)},comments={int(skip_comments)}"
+
+    def lookup(self, options: str, path: str, st: os.stat_result) -> int | None:
+        entry = self.tables.get(options, {}).get(path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        return None
+
+    def store(self, options: str, path: str, st: os.stat_result, n: int) -> None:
+        self.tables.setdefault(options, {})[path] = [st.st_size, st.st_mtime_ns, n]
+
+    def prune(self, root: str, seen: set[str]) -> None:
+        """Drops the entries under `root` whose file was deleted. Files the
+        walk skipped (other extensions, excludes) keep theirs."""
+        prefix: str = os.path.join(root, "")
+        for table in self.tables.values():
+            for path in [p for p in table if p.startswith(prefix) and p not in seen and not os.path.exists(p)]:
+                del table[path]
+
+    def save(self) -> None:
+        write_json(self.path, self.tables)
+
+
+def count_cached(
+    root: str,
+    paths: list[Path],
+    skip_blank: bool = False,
+    skip_comments: bool = False,
+    jobs: int | None = None,
+    cache: LineCache | None = None
+) -> dict[Path, int | None]:
+
+    """`count_all`, reading only the files that changed since the last run.
+    Unreadable files are not cached, they are tried again next time."""
+
+    cache = cache if cache is not None else LineCache()
+    options: str = LineCache.options(skip_blank, skip_comments)
+
+    counts: dict[Path, int | None] = {}
+    stale: list[tuple[Path, str, os.stat_result]] = []
+
+    for p in paths:
+        key: str = os.path.abspath(p)
+        try:
+            st: os.stat_result = os.stat(p)
+        except OSError:
+            counts[p] = count_file_lines(p, skip_blank, skip_comments)  # reports the error
+            continue
+
+        n: int | None = cache.lookup(options, key, st)
+        if n is None:
+            stale.append((p, key, st))
+        else:
+            counts[p] = n
+
+    fresh: dict[Path, int | None] = count_all([p for p, _, _ in stale], skip_blank, skip_comments, jobs)
+    for p, key, st in stale:
+        counts[p] = fresh[p]
+        if fresh[p] is not None:
+            cache.store(options, key, st, fresh[p])
+
+    cache.prune(os.path.abspath(root), {os.path.abspath(p) for p in paths})
+    cache.save()
+
+    return {p: counts[p] for p in paths}
+
+
 def summarise(counts: dict[Path, int]) -> tuple[int, dict[str, int]]:
     grand = 0
     per_ext = defaultdict(int)
@@ -46,14 +434,27 @@ def summarise(counts: dict[Path, int]) -> tuple[int, dict[str, int]]:
     return grand, dict(per_ext)
 
 
-def main(dir: str, skip_blank: bool, skip_comments: bool, exts: list = []) -> None:
+def main(
+    dir: str,
+    skip_blank: bool,
+    skip_comments: bool,
+    exts: list = [],
+    jobs: int | None = None,
+    cache: bool = True,
+    excludes: t.Iterable[str] = (),
+    ignore: bool = True,
+    follow_symlinks: bool = False
+) -> None:
     exts: t.Iterable = exts if exts else DEFAULT_EXTS
 
-    per_file_counts: dict[Path, int] = {}
+    sources: list[Path] = list(iter_source_files(dir, exts, excludes, ignore, follow_symlinks))
+    if cache:
+        counts: dict[Path, int | None] = count_cached(dir, sources, skip_blank, skip_comments, jobs)
+    else:
+        counts: dict[Path, int | None] = count_all(sources, skip_blank, skip_comments, jobs)
+    per_file_counts: dict[Path, int] = {p: n or 0 for p, n in counts.items()}  # unreadable counts as 0, as before
 
-    for src in iter_source_files(dir, exts):
-        n = count_file_lines(src, skip_blank, skip_comments)
-        per_file_counts[src] = n
+    for src, n in per_file_counts.items():
         print(f"{src}: {n}")
 
     grand, per_ext = summarise(per_file_counts)
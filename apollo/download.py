@@ -6,29 +6,65 @@ from __future__ import annotations
 import os
 import urllib.error
 import pytube
+import random
 import yt_dlp
 import re
+import shutil
+import sys
+import threading
+import time
 import urllib
 import colorama
 import click
 
-from typing import Literal
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Literal
+from .cache import MediaCache
 from .config import get as config_get
 
-def get_unique_filename(output_path: str, base: str, ext: str) -> str:
-    i = 0
-    filename = os.path.join(output_path, f"{base}{ext}")
 
-    while os.path.exists(filename):
-        i += 1
-        suffix = f" (copy{f' {i}' if i > 1 else ''})"
+YOUTUBE_URL_PATTERN: str = r'^https?://(www\.)?(youtube\.com/watch\?v=|youtu\.be/)[\w-]{11}$'
+
+# progress(downloaded bytes, total bytes or None)
+Progress = Callable[[int, 'int | None'], None]
+Backend  = Callable[[str, str, Literal['best', 'worst'], 'Progress | None'], None]
+
+
+def video_id(url: str) -> str:
+    if not re.match(YOUTUBE_URL_PATTERN, url):
+        raise ValueError(f'Given URL is not a valid youtube link: {url}')
+    return url[-11:]
+
+
+def reserve_filename(output_path: str, base: str, ext: str) -> str:
+    '''First free `base (copy n)ext` name in `output_path`. The name is taken
+    by creating an empty file there (O_EXCL), so two downloads running at
+    once, in threads or processes, never get the same one.'''
+    i = 0
+    while True:
+        suffix = f" (copy{f' {i}' if i > 1 else ''})" if i else ''
         filename = os.path.join(output_path, f"{base}{suffix}{ext}")
+        try:
+            os.close(os.open(filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return filename
+        except FileExistsError:
+            i += 1
 
-    return filename
+
+def partial_filename(output_path: str, url: str, res: Literal['best', 'worst']) -> str:
+    '''Where `url` is downloaded to before it gets its final name. It only
+    depends on the video, so an interrupted download resumes from the
+    `.part` file yt-dlp left there.'''
+    return os.path.join(output_path, f'.apollo-{video_id(url)}-{res}.mp4')
 
 
-def download_via_ytdlt(url: str, filename: str, output_path: str, res: Literal['best', 'worst']) -> None:
+def download_via_ytdlt(
+    url: str, filename: str, output_path: str, res: Literal['best', 'worst'], progress: Progress | None = None
+) -> None:
     yt_cls: pytube.YouTube = pytube.YouTube(url)
+    if progress is not None:
+        yt_cls.register_on_progress_callback(
+            lambda stream, chunk, remaining: progress(stream.filesize - remaining, stream.filesize))
     if res == 'best':
         video = yt_cls.streams.get_highest_resolution()
     elif res == 'worst':
@@ -36,7 +72,9 @@ def download_via_ytdlt(url: str, filename: str, output_path: str, res: Literal['
     video.download(output_path=output_path, filename=filename)
 
 
-def download_via_pytube(url: str, filename: str, output_path: str, res: Literal['best', 'worst']) -> None:
+def download_via_pytube(
+    url: str, filename: str, output_path: str, res: Literal['best', 'worst'], progress: Progress | None = None
+) -> None:
     format_expr = {
         'best': 'bestvideo+bestaudio/best',
         'worst': 'worstvideo+worstaudio/worst'
@@ -45,21 +83,83 @@ def download_via_pytube(url: str, filename: str, output_path: str, res: Literal[
     ydl_opts: dict = {
         'format': format_expr,
         'outtmpl': os.path.join(output_path, filename),
-        'merge_output_format': 'mp4'}
+        'merge_output_format': 'mp4',
+        'continuedl': True}
+
+    if progress is not None:
+        ydl_opts.update({
+            'quiet': True,
+            'noprogress': True,
+            'progress_hooks': [lambda d: progress(d.get('downloaded_bytes') or 0,
+                                                  d.get('total_bytes') or d.get('total_bytes_estimate'))]})
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         ydl.download([url])
 
 
-def download(url: str, output_path: str | None, res: Literal['best', 'worst'], open: bool) -> str:
+def fetch(url: str, path: str, res: Literal['best', 'worst'], progress: Progress | None = None) -> None:
+    '''Default batch backend: yt-dlp, pytube when that gets an HTTP error'''
+    output_path, filename = os.path.split(path)
+    try:
+        download_via_pytube(url, filename, output_path, res, progress)
+    except urllib.error.HTTPError:
+        download_via_ytdlt(url, filename, output_path, res, progress)
 
-    colorama.init()
 
-    pattern = r'^https?://(www\.)?(youtube\.com/watch\?v=|youtu\.be/)[\w-]{11}$'
+def stream_url(url: str, res: Literal['best', 'worst'] = 'worst') -> str:
+    '''Direct media URL that OpenCV (ffmpeg) can read while it downloads.
+    Links other than youtube ones are assumed to point at the media already.'''
 
-    if not re.match(pattern, url):
-        raise ValueError('Given URL is not a valid youtube link.')
+    if not re.match(YOUTUBE_URL_PATTERN, url):
+        return url
+
+    ydl_opts: dict = {
+        'format': f'{res}video[ext=mp4]/{res}',
+        'quiet': True}
 
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info: dict = ydl.extract_info(url, download=False)
+
+    return info['url']
+
+
+def copy_from_cache(url: str, output_path: str, res: Literal['best', 'worst'], cache: MediaCache) -> str | None:
+    '''Copies a cached download of `url` into `output_path`, None on a miss'''
+    cached: str | None = cache.get(video_id(url), res) if cache.enabled else None
+    if cached is None: return None
+
+    filename: str = reserve_filename(output_path, 'yt-download', ext='.mp4')
+    shutil.copyfile(cached, filename)
+    return filename
+
+
+def cache_lookup(url: str, res: Literal['best', 'worst']) -> str | None:
+    '''Cached file of a youtube `url`, None on a miss or when not cacheable'''
+    cache: MediaCache = MediaCache()
+    if not cache.enabled or not re.match(YOUTUBE_URL_PATTERN, url): return None
+    return cache.get(video_id(url), res)
+
+
+def cached_download(url: str, res: Literal['best', 'worst']) -> str | None:
+    '''Path of `url` in the media cache, downloaded straight into it on a
+    miss. None when the cache is disabled.'''
+    cache: MediaCache = MediaCache()
+    if not cache.enabled: return None
+
+    video: str = video_id(url)
+    if (cached := cache.get(video, res)) is not None:
+        return cached
+
+    os.makedirs(cache.root, exist_ok=True)
+    partial: str = partial_filename(cache.root, url, res)
+
+    print('Downloading YouTube video...')
+    fetch(url, partial, res)
+    return cache.put(video, res, partial, move=True)
+
+
+def resolve_output_path(output_path: str | None) -> str:
+    '''`output_path`, else `download-output-path` from the config'''
     output_path = output_path if output_path is not None else config_get('download-output-path')
     if output_path in [None, 'None', '']:  # Handle any form of unset
         raise click.UsageError(
@@ -67,23 +167,184 @@ def download(url: str, output_path: str | None, res: Literal['best', 'worst'], o
             "Use the following command to set it:\n"
             "  apollo config --set download-output-path /your/path/here"
         )
+    return output_path
+
+
+def download(url: str, output_path: str | None, res: Literal['best', 'worst'], open: bool) -> str:
 
-    filename: str = get_unique_filename(output_path, 'yt-download', ext='.mp4')
+    colorama.init()
+
+    if not re.match(YOUTUBE_URL_PATTERN, url):
+        raise ValueError('Given URL is not a valid youtube link.')
+
+    output_path = resolve_output_path(output_path)
+
+    cache: MediaCache = MediaCache()
+    if (filename := copy_from_cache(url, output_path, res, cache)) is not None:
+        print(f'\033[1;32mCopied from cache: {filename}\033[0m')
+        if open: os.startfile(filename)
+        return filename
+
+    partial: str = partial_filename(output_path, url, res)
 
     try:
         print('Downloading YouTube video via pytube...')
-        download_via_pytube(url, filename, output_path, res)
+        download_via_pytube(url, os.path.basename(partial), output_path, res)
     except urllib.error.HTTPError:
         print('Failed to download via pytube')
         print('Downloading YouTube video via yt-dlp...')
-        download_via_ytdlt(url, filename, output_path, res)
+        download_via_ytdlt(url, os.path.basename(partial), output_path, res)
 
     except yt_dlp.DownloadError:
         print(f'Could not download given youtube video: {url}')
         return
 
+    filename: str = reserve_filename(output_path, 'yt-download', ext='.mp4')
+    os.replace(partial, filename)
+    if cache.enabled: cache.put(video_id(url), res, filename)
+
     print(f'\033[1;32mDownload complete: {filename}\033[0m')
 
-    output_path: str = os.path.join(output_path, filename)
-    if open: os.startfile(output_path)
-    return output_path
\ No newline at end of file
+    if open: os.startfile(filename)
+    return filename
+
+
+def read_url_list(path: str) -> list[str]:
+    '''URLs of a list file, one per line, `#` starts a comment'''
+    with open(path, 'r') as f:
+        lines = (line.split('#', 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+class BatchProgress:
+    '''One status line per active download under the finished ones,
+    redrawn in place at most `fps` times a second'''
+
+    def __init__(self, total: int, file=sys.stdout, fps: float = 10) -> None:
+        self.total:    int = total
+        self.finished: int = 0
+        self.file = file
+        self.interval: float = 1 / fps
+
+        self._active: dict[str, str] = {}
+        self._drawn:  int = 0
+        self._last:   float = 0.0
+        self._lock:   threading.Lock = threading.Lock()
+
+    def _draw(self, done: str | None = None) -> None:
+        out: list[str] = [f'\033[{self._drawn}F' if self._drawn else '']
+        if done is not None:
+            out.append(f'\033[2K{done}\n')
+        # a wrapped line would throw off the cursor moves of the next redraw
+        width: int = shutil.get_terminal_size().columns - 1
+        out.extend(f'\033[2K{line[:width]}\n' for line in self._active.values())
+        out.append(f'\033[2K[{self.finished}/{self.total}] {len(self._active)} active\n')
+        out.append('\033[J')
+        self.file.write(''.join(out))
+        self.file.flush()
+        self._drawn = len(self._active) + 1
+        self._last = time.perf_counter()
+
+    def update(self, url: str, status: str, force: bool = False) -> None:
+        with self._lock:
+            self._active[url] = f'{url}  {status}'
+            if force or time.perf_counter() - self._last >= self.interval:
+                self._draw()
+
+    def tracker(self, url: str) -> Progress:
+        def progress(done: int, total: int | None) -> None:
+            status: str = f'{done / total:6.1%}' if total else f'{done / 1e6:.1f} MB'
+            self.update(url, status)
+        return progress
+
+    def finish(self, url: str, message: str) -> None:
+        with self._lock:
+            self._active.pop(url, None)
+            self.finished += 1
+            self._draw(message)
+
+
+def download_one(
+    url: str,
+    output_path: str,
+    res: Literal['best', 'worst'],
+    backend: Backend,
+    retries: int,
+    backoff: float,
+    progress: BatchProgress,
+    cache: MediaCache
+) -> str:
+
+    if (filename := copy_from_cache(url, output_path, res, cache)) is not None:
+        return filename
+
+    partial: str = partial_filename(output_path, url, res)
+
+    for attempt in range(retries + 1):
+        try:
+            progress.update(url, 'starting' if attempt == 0 else f'retry {attempt}/{retries}', force=True)
+            backend(url, partial, res, progress.tracker(url))
+            break
+        except (yt_dlp.DownloadError, urllib.error.URLError, OSError) as e:
+            if attempt == retries: raise
+            # exponential backoff with jitter, the partial file is kept and resumed
+            delay: float = backoff * 2 ** attempt * (1 + random.random())
+            progress.update(url, f'failed ({type(e).__name__}), retrying in {delay:.1f}s', force=True)
+            time.sleep(delay)
+
+    filename: str = reserve_filename(output_path, 'yt-download', ext='.mp4')
+    os.replace(partial, filename)
+    if cache.enabled: cache.put(video_id(url), res, filename)
+    return filename
+
+
+def download_batch(
+    urls: Iterable[str],
+    output_path: str | None,
+    res: Literal['best', 'worst'],
+    jobs: int = 4,
+    retries: int = 3,
+    backoff: float = 1.0,
+    backend: Backend = fetch,
+    cache: MediaCache | None = None
+) -> dict[str, str | None]:
+
+    '''Downloads every URL on a pool of `jobs` threads. A failing download is
+    retried `retries` times, resuming the partial file, before it is given
+    up on. `backend(url, path, res, progress)` does the actual download, the
+    default being `fetch`. Videos in the media cache are copied from there.
+    Returns each URL's file, None for the failed ones. URLs of the same
+    video are downloaded once and share the file.'''
+
+    colorama.init()
+
+    # the partial file is named by video id: two links to one video
+    # (youtu.be and watch?v=) must not download into it at the same time
+    urls = list(urls)
+    first: dict[str, str] = {}
+    for url in urls: first.setdefault(video_id(url), url)
+    unique: list[str] = list(first.values())
+
+    output_path = resolve_output_path(output_path)
+
+    cache = cache if cache is not None else MediaCache()
+    progress: BatchProgress = BatchProgress(len(unique))
+    results: dict[str, str | None] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures: dict = {
+            pool.submit(download_one, url, output_path, res, backend, retries, backoff, progress, cache): url
+            for url in unique
+        }
+        for future in as_completed(futures):
+            url: str = futures[future]
+            try:
+                results[url] = future.result()
+                progress.finish(url, f'\033[1;32mDone\033[0m   {url} -> {results[url]}')
+            except Exception as e:
+                results[url] = None
+                progress.finish(url, f'\033[1;31mFailed\033[0m {url}: {e}')
+
+    failed: int = sum(path is None for path in results.values())
+    print(f'{len(unique) - failed} downloaded, {failed} failed.')
+    return {url: results[first[video_id(url)]] for url in urls}
\ No newline at end of file
@@ -4,7 +4,9 @@
 from __future__ import annotations
 
 import numpy as np, sys
+import os
 import sys
+import time
 
 from numpy.typing import NDArray
 from typing import Protocol, Any, runtime_checkable
@@ -26,39 +28,108 @@ def resample(array: NDArray, target_len: int) -> NDArray:
     return np.interp(x_new, x_old, array)
 
 
+def minmax_decimate(array: NDArray, bins: int, chunk_size: int = 1 << 20) -> tuple[NDArray, NDArray]:
+    '''Min and max of `bins` consecutive, equal slices of `array` in one pass.
+
+    Unlike `resample` no spike is lost. The input is read `chunk_size`
+    samples at a time, so memory-mapped arrays never load in full.'''
+
+    n: int = len(array)
+    if n < bins:
+        raise ValueError(f'Cannot split {n} samples into {bins} bins.')
+
+    edges: NDArray = np.arange(bins + 1) * n // bins
+    lo: NDArray = np.full(bins, np.inf)
+    hi: NDArray = np.full(bins, -np.inf)
+
+    for start in range(0, n, chunk_size):
+        stop: int = min(start + chunk_size, n)
+        block: NDArray = np.asarray(array[start:stop], dtype=np.float64)
+
+        # bins overlapping this block, and where each one starts in it
+        first: int = int(np.searchsorted(edges, start, 'right')) - 1
+        last:  int = int(np.searchsorted(edges, stop, 'left'))
+        offsets: NDArray = np.maximum(edges[first:last], start) - start
+
+        np.minimum(lo[first:last], np.minimum.reduceat(block, offsets), out=lo[first:last])
+        np.maximum(hi[first:last], np.maximum.reduceat(block, offsets), out=hi[first:last])
+
+    return lo, hi
+
+
+# bit of every dot of a braille cell, by (row, column)
+BRAILLE_DOTS: NDArray = np.array([
+    [0x01, 0x08],
+    [0x02, 0x10],
+    [0x04, 0x20],
+    [0x40, 0x80],
+])
+
+
+def braille(pixels: NDArray) -> NDArray:
+    '''`(4h, 2w)` boolean pixels to `(h, w)` braille characters'''
+    rows, cols = pixels.shape
+    cells: NDArray = pixels.reshape(rows // 4, 4, cols // 2, 2)
+    codes: NDArray = np.einsum('ijkl,jl->ik', cells.astype(np.uint32), BRAILLE_DOTS)
+    return (codes + 0x2800).astype(np.uint32).view('<U1')
+
+
+def load_series(path: str, dtype: str | None = None) -> NDArray:
+    '''Memory maps a `.npy` file, or a raw binary file of `dtype` values'''
+    if dtype is None:
+        return np.load(path, mmap_mode='r').ravel()
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
 def echo_graph(
     x: NDArray,
     y: NDArray,
     xattr: str | None = None,
     yattr: str | None = None,
     file: SuportsWrite | None = None,
-    flush: bool = False
+    flush: bool = False,
+    width: int = 80,
+    height: int = 12,
+    use_braille: bool = False
 ) -> None:
 
-    '''Plots ascii cartesian grapth into a stream or sys.stdout (default)'''
+    '''Plots ascii cartesian grapth into a stream or sys.stdout (default)
+
+    With `use_braille` every character carries 2x4 dots. Series longer than
+    the plot is wide are min/max decimated, each column spanning the range
+    of its samples; `x` is then taken as evenly spaced and not read.'''
 
     file = sys.stdout if file is None else file
 
     if not isinstance(file, SuportsWrite):
         raise TypeError('File must suport writing.')
 
-    width, height = 80, 12
+    cols: int = width  * 2 if use_braille else width
+    rows: int = height * 4 if use_braille else height
+    pixels: NDArray = np.zeros((rows, cols), dtype=bool)
+
+    if len(x) == len(y) and len(y) > cols:
+        lo, hi = minmax_decimate(y, cols)
+        ymin, span = lo.min(), hi.max() - lo.min()
+
+        top:    NDArray = rows - 1 - ((hi - ymin) / (span + 1e-8) * (rows - 1)).astype(int)
+        bottom: NDArray = rows - 1 - ((lo - ymin) / (span + 1e-8) * (rows - 1)).astype(int)
+        pixels[(np.arange(rows)[:, None] >= top) & (np.arange(rows)[:, None] <= bottom)] = True
 
-    if len(x) != len(y) or len(x) > width:
-        x: NDArray = resample(x, width)
-        y: NDArray = resample(y, width)
+    else:
+        if len(x) != len(y):
+            x: NDArray = resample(x, cols)
+            y: NDArray = resample(y, cols)
 
-    x_norm = (x - np.min(x)) / (np.ptp(x) + 1e-8)
-    y_norm = (y - np.min(y)) / (np.ptp(y) + 1e-8)
+        x_norm = (x - np.min(x)) / (np.ptp(x) + 1e-8)
+        y_norm = (y - np.min(y)) / (np.ptp(y) + 1e-8)
 
-    x_scaled = (x_norm * (width  - 1)).astype(int)
-    y_scaled = (y_norm * (height - 1)).astype(int)
+        x_scaled = (x_norm * (cols - 1)).astype(int)
+        y_scaled = (y_norm * (rows - 1)).astype(int)
 
-    canvas: list = [[' ' for _ in range(width)] for _ in range(height)]
+        pixels[rows - 1 - y_scaled, x_scaled] = True
 
-    for xi, yi in zip(x_scaled, y_scaled):
-        row: int = height - 1 - yi
-        canvas[row][xi] = '•'
+    canvas: NDArray = braille(pixels) if use_braille else np.where(pixels, '•', ' ')
 
     for row in canvas:
         file.write(''.join(row) + '\n')
@@ -67,6 +138,167 @@ def echo_graph(
         file.flush()
 
 
+def plot_file(
+    path: str,
+    dtype: str | None = None,
+    width: int = 80,
+    height: int = 12,
+    use_braille: bool = False
+) -> None:
+
+    '''Plots a whole `.npy` or raw binary series with bounded memory'''
+
+    y: NDArray = load_series(path, dtype)
+    echo_graph(np.arange(len(y)), y, width=width, height=height, use_braille=use_braille, flush=True)
+
+
+class RingBuffer:
+    '''Fixed size float buffer keeping the latest `capacity` samples. Every
+    sample is written twice, so the window is always one contiguous slice.'''
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = capacity
+        self.data: NDArray = np.full(2 * capacity, np.nan)
+        self.head: int = 0  # where the next sample goes, the oldest one sits there
+
+    def extend(self, values: NDArray) -> None:
+        values = values[-self.capacity:]
+        idx: NDArray = (self.head + np.arange(values.size)) % self.capacity
+        self.data[idx] = values
+        self.data[idx + self.capacity] = values
+        self.head = (self.head + values.size) % self.capacity
+
+    def view(self) -> NDArray:
+        '''Oldest to newest, NaN where nothing was written yet'''
+        return self.data[self.head:self.head + self.capacity]
+
+
+class LivePlot:
+    '''Plot of the latest `capacity` samples, redrawn in place at most `fps`
+    times a second. Each column spans the min to max of its samples, so
+    spikes survive, and the y axis follows the window.'''
+
+    def __init__(
+        self,
+        width: int = 80,
+        height: int = 12,
+        capacity: int | None = None,
+        fps: float = 20,
+        file: SuportsWrite | None = None
+    ) -> None:
+
+        per_column: int = max(1, -(-(capacity or 8 * width) // width))
+
+        self.width, self.height = width, height
+        self.buffer: RingBuffer = RingBuffer(per_column * width)
+        self.interval: float = 1 / fps
+        self.file: SuportsWrite = sys.stdout if file is None else file
+
+        self.canvas: NDArray = np.full((height, width + 1), ' ', dtype='<U1')
+        self.canvas[:, -1] = '\n'
+        self.rows: NDArray = np.arange(height)[:, None]
+
+        self._last: float = 0.0
+        self._drawn: bool = False
+
+    def push(self, values: NDArray) -> None:
+        self.buffer.extend(np.asarray(values, dtype=np.float64).ravel())
+
+    def render(self) -> str:
+        columns: NDArray = self.buffer.view().reshape(self.width, -1)
+        lo: NDArray = np.fmin.reduce(columns, axis=1)  # fmin/fmax skip NaN
+        hi: NDArray = np.fmax.reduce(columns, axis=1)
+
+        filled: NDArray = ~np.isnan(lo)
+        plot: NDArray = self.canvas[:, :-1]
+        plot.fill(' ')
+
+        if filled.any():
+            ymin, ymax = lo[filled].min(), hi[filled].max()
+            scale: float = (self.height - 1) / (ymax - ymin + 1e-8)
+
+            top:    NDArray = self.height - 1 - ((np.where(filled, hi, ymin) - ymin) * scale).astype(int)
+            bottom: NDArray = self.height - 1 - ((np.where(filled, lo, ymin) - ymin) * scale).astype(int)
+            plot[(self.rows >= top) & (self.rows <= bottom) & filled] = '•'
+
+            status: str = f'{ymin:.6g} .. {ymax:.6g}'
+        else:
+            status: str = 'waiting for data'
+
+        # the canvas is one contiguous block of characters, read it as one string
+        return self.canvas.ravel().view(f'<U{self.canvas.size}')[0] + status.ljust(self.width)[:self.width]
+
+    def draw(self, force: bool = False) -> None:
+        now: float = time.perf_counter()
+        if not force and now - self._last < self.interval: return
+        self._last = now
+
+        # back to the first line of the previous drawing
+        head: str = f'\r\033[{self.height}A' if self._drawn else ''
+        self.file.write(head + self.render())
+        self.file.flush()
+        self._drawn = True
+
+
+def parse_numbers(lines: list[bytes]) -> NDArray:
+    '''Every number found in `lines`, whitespace or comma separated'''
+    tokens: list[bytes] = b' '.join(lines).replace(b',', b' ').split()
+    try:
+        return np.array(tokens, dtype=np.float64)
+    except ValueError:
+        # a bad token somewhere, keep what parses
+        values: list[float] = []
+        for token in tokens:
+            try:
+                values.append(float(token))
+            except ValueError:
+                pass
+        return np.array(values, dtype=np.float64)
+
+
+def live(
+    path: str | None = None,
+    follow: bool = False,
+    width: int = 80,
+    height: int = 12,
+    capacity: int | None = None,
+    fps: float = 20
+) -> None:
+
+    '''Plots the numbers read from `path` (stdin when None) as they arrive.
+    With `follow` the file is tailed like `tail -f` instead of ending at EOF.'''
+
+    plot: LivePlot = LivePlot(width, height, capacity, fps)
+    fh = sys.stdin.buffer if path is None else open(path, 'rb')
+    fd: int = fh.fileno()
+    tail: bytes = b''
+
+    try:
+        while True:
+            chunk: bytes = os.read(fd, 1 << 16)
+
+            if not chunk:
+                if follow and path is not None:
+                    plot.draw()
+                    time.sleep(plot.interval)
+                    continue
+                break
+
+            lines: list[bytes] = (tail + chunk).split(b'\n')
+            tail = lines.pop()
+            plot.push(parse_numbers(lines))
+            plot.draw()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        plot.push(parse_numbers([tail]))
+        plot.draw(force=True)
+        plot.file.write('\n')
+        if path is not None: fh.close()
+
+
 if __name__ == '__main__':
     x = np.linspace(0, 10, 50)
     y = np.sin(np.linspace(0, 10, 100))
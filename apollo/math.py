@@ -4,18 +4,126 @@
 from __future__ import annotations
 
 
+import ast
+import csv
 import math
 import numpy as np
+import sys
 
-from typing import Any, List, Dict, Callable
-from itertools import chain
+from functools import lru_cache
+from typing import Any, List, Dict, Callable, IO, Iterator
+from itertools import chain, islice
 
 
-def main(*args: Any, operation: str = 'eval') -> float:
+# names an expression may use, numpy versions so they work on whole columns too
+FUNCTIONS: Dict[str, Any] = {
+    'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log2': np.log2, 'log10': np.log10,
+    'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan,
+    'sinh': np.sinh, 'cosh': np.cosh, 'tanh': np.tanh, 'atan2': np.arctan2, 'hypot': np.hypot,
+    'abs': np.abs, 'floor': np.floor, 'ceil': np.ceil, 'round': np.round,
+    'min': np.minimum, 'max': np.maximum,
+    'pi': math.pi, 'e': math.e, 'tau': math.tau,
+}
+
+_NODES: tuple = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub,
+)
+
+
+def _operands(node: ast.AST) -> Iterator[ast.Constant]:
+    '''Constants in the arithmetic under `node`, not the arguments of calls'''
+    if isinstance(node, ast.Constant):
+        yield node
+    elif isinstance(node, ast.BinOp):
+        yield from _operands(node.left)
+        yield from _operands(node.right)
+    elif isinstance(node, ast.UnaryOp):
+        yield from _operands(node.operand)
+
+
+class Expression:
+    '''Arithmetic expression checked against a whitelist of AST nodes and
+    names, then compiled once. Any other name is a variable, given as keyword
+    arguments on call, scalars or NumPy arrays alike.'''
+
+    def __init__(self, source: str) -> None:
+        tree: ast.Expression = ast.parse(source.strip(), mode='eval')
+
+        for node in ast.walk(tree):
+            if not isinstance(node, _NODES):
+                raise ValueError(f'Unsupported syntax in expression: {type(node).__name__}')
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError(f'Unsupported constant in expression: {node.value!r}')
+            if isinstance(node, ast.Call) and \
+               (not isinstance(node.func, ast.Name) or not callable(FUNCTIONS.get(node.func.id)) or node.keywords):
+                raise ValueError(f'Unsupported function call: {ast.unparse(node.func)}')
+            if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+                # floats overflow quickly, python ints could grow forever
+                # (9**9**9): powers compute in floats, other ints stay ints
+                for constant in _operands(node):
+                    constant.value = float(constant.value)
+
+        self.source: str = source
+        self.variables: frozenset = frozenset(
+            node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id not in FUNCTIONS)
+        self.code = compile(tree, '<expression>', 'eval')
+
+    def __call__(self, **variables: Any) -> Any:
+        missing: set = self.variables - variables.keys()
+        if missing:
+            raise ValueError(f'Missing value for: {", ".join(sorted(missing))}')
+        return eval(self.code, {'__builtins__': {}}, {**FUNCTIONS, **variables})
+
+
+@lru_cache(maxsize=256)
+def compile_expression(source: str) -> Expression:
+    return Expression(source)
+
+
+def evaluate(source: str, **variables: Any) -> Any:
+    return compile_expression(source)(**variables)
+
+
+def read_columns(fh: IO[str], chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+    '''Chunks of a CSV file with a header row, as one float array per column'''
+    reader = csv.reader(fh)
+    header: List[str] = [name.strip() for name in next(reader)]
+
+    while rows := list(islice(reader, chunk_size)):
+        table: np.ndarray = np.array(rows, dtype=np.float64).reshape(len(rows), len(header))
+        yield dict(zip(header, table.T))
+
+
+def evaluate_csv(
+    source: str,
+    path: str,
+    variables: Dict[str, float] | None = None,
+    chunk_size: int = 65536,
+    out: IO[str] | None = None
+) -> None:
+
+    '''Evaluates `source` over whole columns of a CSV file (`-` for stdin),
+    `chunk_size` rows at a time, writing one result per row'''
+
+    expression: Expression = compile_expression(source)
+    out = sys.stdout if out is None else out
+    fh: IO[str] = sys.stdin if path == '-' else open(path, newline='')
+
+    try:
+        for columns in read_columns(fh, chunk_size):
+            result: np.ndarray = np.broadcast_to(
+                expression(**{**(variables or {}), **columns}), (len(next(iter(columns.values()))),))
+            out.write('\n'.join(map(repr, result.tolist())) + '\n')
+    finally:
+        if fh is not sys.stdin: fh.close()
+
+
+def main(*args: Any, operation: str = 'eval', variables: Dict[str, float] | None = None) -> float:
     args: List[str] = list(chain.from_iterable(args)) if isinstance(args[0], (list, tuple)) else list(args)
 
     if operation == 'eval':
-        return float(eval(' '.join(args)))
+        return float(evaluate(' '.join(args), **(variables or {})))
 
     nums: List[float] = list(map(float, args))
 
@@ -0,0 +1,222 @@
+# mesh.py
+# Spinning ASCII render of a triangle mesh, the donut engine for any .obj model
+
+from __future__ import annotations
+
+import numpy as np
+import os
+import time
+
+from math import cos, sin
+from numpy.typing import NDArray
+
+from .ansi import HOME
+from .ascii import LUMINANCE_RAMP, echo_bytes
+from .profiling import Profiler, untimed
+
+
+def load_obj(path: str) -> tuple[NDArray, NDArray]:
+    '''Vertices (N, 3) and triangles (M, 3) of a Wavefront .obj file.
+    Polygons are split into fans, texture and normal indices are ignored.'''
+
+    vertices: list[list[str]] = []
+    faces:    list[list[int]] = []
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+        for line in fh:
+            if line.startswith('v '):
+                vertices.append(line.split()[1:4])
+            elif line.startswith('f '):
+                # `f 1/2/3 4/5/6 ...`, negative indices count from the end
+                corners: list[int] = [int(token.split('/', 1)[0]) for token in line.split()[1:]]
+                corners = [c - 1 if c > 0 else len(vertices) + c for c in corners]
+                faces.extend([corners[0], corners[i], corners[i + 1]] for i in range(1, len(corners) - 1))
+
+    if not vertices or not faces:
+        raise ValueError(f'{path} has no triangles.')
+
+    return np.array(vertices, dtype=np.float64), np.array(faces, dtype=np.intp)
+
+
+class Mesh:
+    '''Draws a mesh with flat shaded triangles, `Donut` style.
+
+    The model is centered and scaled into the unit sphere once, its face
+    normals are computed once. Every frame rotates all vertices and normals
+    with one matrix product each, drops the faces pointing away from the
+    viewer and rasterizes the rest at the cell centers they cover, in
+    buckets of similar size so the whole frame stays vectorized. The
+    z-buffer is a scatter of the samples sorted by depth.'''
+
+    def __init__(self, vertices: NDArray, faces: NDArray, K2: float = 3) -> None:
+        center: NDArray = (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+        vertices = vertices - center
+        vertices /= np.sqrt((vertices ** 2).sum(axis=1)).max() or 1
+
+        self.vertices: NDArray = vertices
+        self.faces:    NDArray = np.ascontiguousarray(faces.T)  # (3, M), a row per corner
+        self.K2: float = K2
+
+        v0, v1, v2 = vertices[self.faces]
+        normals: NDArray = np.cross(v1 - v0, v2 - v0)
+        length:  NDArray = np.sqrt((normals ** 2).sum(axis=1))
+        keep:    NDArray = length > 0  # degenerate triangles have no side to show
+        self.faces   = self.faces[:, keep]
+        self.normals: NDArray = normals[keep] / length[keep, None]
+
+        # light from above and behind the viewer, as in the donut
+        self.light: NDArray = np.array([0, 1, 1]) / np.sqrt(2)
+        self.ramp:  NDArray = np.frombuffer(LUMINANCE_RAMP.encode(), dtype=np.uint8)
+
+        self._rotated: NDArray = np.empty_like(self.vertices)
+        self._normals: NDArray = np.empty_like(self.normals)
+        self._screen:  NDArray = np.empty((3, len(self.vertices)))  # x, y, 1/z
+        self._shape:   tuple[int, int] | None = None
+        self._frame:   bytearray | None = None
+        self._chars:   NDArray | None = None
+
+    @staticmethod
+    def rotation(a: float, b: float) -> NDArray:
+        '''`a` around the X axis, then `b` around the Y axis'''
+        cosA, sinA, cosB, sinB = cos(a), sin(a), cos(b), sin(b)
+        rx: NDArray = np.array([[1, 0, 0], [0, cosA, -sinA], [0, sinA, cosA]])
+        ry: NDArray = np.array([[cosB, 0, sinB], [0, 1, 0], [-sinB, 0, cosB]])
+        return ry @ rx
+
+    def _allocate(self, width: int, height: int) -> None:
+        self._shape = (width, height)
+        self._frame = bytearray(len(HOME) + width * height)
+        self._frame[:len(HOME)] = HOME
+        self._chars = np.frombuffer(self._frame, dtype=np.uint8, offset=len(HOME))
+
+    def render_frame(self, a: float, b: float, width: int, height: int) -> memoryview:
+        if self._shape != (width, height):
+            self._allocate(width, height)
+        self._chars.fill(ord(' '))
+
+        rotation: NDArray = self.rotation(a, b)
+        np.matmul(self.vertices, rotation.T, out=self._rotated)
+        np.matmul(self.normals,  rotation.T, out=self._normals)
+
+        # the camera sits at z = K2 looking down -z. K1 fits the unit sphere
+        # in the screen, x is doubled as cells are about twice as tall as wide
+        K1: float = .9 * (self.K2 - 1) * min(height / 2, width / 4)
+        x, y, ooz = self._screen
+        np.subtract(self.K2, self._rotated[:, 2], out=ooz)
+        np.reciprocal(ooz, out=ooz)
+        np.multiply(self._rotated[:, 0], ooz, out=x)
+        x *= 2 * K1
+        x += width / 2
+        np.multiply(self._rotated[:, 1], ooz, out=y)
+        y *= -K1
+        y += height / 2
+
+        # back face culling: keep the faces whose normal points at the camera
+        corner: NDArray = self._rotated[self.faces[0]]
+        facing: NDArray = self.K2 * self._normals[:, 2] - (self._normals * corner).sum(axis=1) > 0
+        faces:  NDArray = self.faces[:, facing]
+
+        luminance: NDArray = self._normals[facing] @ self.light
+        glyphs: NDArray = self.ramp[(np.clip(luminance, 0, 1) * (len(self.ramp) - 1) + .5).astype(np.intp)]
+
+        cells, depth, shade = self.rasterize(self._screen[:, faces], glyphs, width, height)
+
+        # nearest last: with repeated indices numpy keeps the last value assigned
+        order: NDArray = np.argsort(depth, kind='stable')
+        self._chars[cells[order]] = shade[order]
+
+        return memoryview(self._frame)
+
+    @staticmethod
+    def rasterize(
+        corners: NDArray, glyphs: NDArray, width: int, height: int
+    ) -> tuple[NDArray, NDArray, NDArray]:
+
+        '''Cells whose center lies inside a triangle, with the interpolated
+        1/z there and the triangle's glyph. `corners` is (3, 3, M): x, y and
+        1/z of the three corners of every triangle.'''
+
+        x, y, ooz = corners
+
+        # cell centers sit at i + .5, so a triangle covers columns
+        # ceil(min x - .5) .. floor(max x - .5)
+        left:   NDArray = np.maximum(np.ceil(x.min(axis=0) - .5), 0).astype(np.intp)
+        right:  NDArray = np.minimum(np.floor(x.max(axis=0) - .5), width - 1).astype(np.intp)
+        top:    NDArray = np.maximum(np.ceil(y.min(axis=0) - .5), 0).astype(np.intp)
+        bottom: NDArray = np.minimum(np.floor(y.max(axis=0) - .5), height - 1).astype(np.intp)
+        columns, rows = right - left + 1, bottom - top + 1
+
+        # signed doubled area, the denominator of the barycentric coordinates
+        area: NDArray = (x[1] - x[0]) * (y[2] - y[0]) - (x[2] - x[0]) * (y[1] - y[0])
+        span: NDArray = np.maximum(columns, rows)
+        hits: NDArray = np.flatnonzero((columns > 0) & (rows > 0) & (area != 0))
+
+        # triangles of similar size are tested against the same grid of offsets
+        buckets: NDArray = np.ceil(np.log2(span[hits])).astype(np.intp)
+
+        cells: list[NDArray] = []
+        depth: list[NDArray] = []
+        shade: list[NDArray] = []
+
+        for bucket in np.unique(buckets):
+            tri: NDArray = hits[buckets == bucket]
+            side: int = 1 << int(bucket)
+            oy, ox = np.divmod(np.arange(side * side), side)
+
+            px: NDArray = left[tri, None] + ox
+            py: NDArray = top[tri, None] + oy
+            cx, cy = px + .5, py + .5
+
+            tx, ty = x[:, tri, None], y[:, tri, None]
+            inv: NDArray = 1 / area[tri, None]
+            b0: NDArray = ((tx[1] - cx) * (ty[2] - cy) - (tx[2] - cx) * (ty[1] - cy)) * inv
+            b1: NDArray = ((tx[2] - cx) * (ty[0] - cy) - (tx[0] - cx) * (ty[2] - cy)) * inv
+            b2: NDArray = 1 - b0 - b1
+
+            inside: NDArray = (ox < columns[tri, None]) & (oy < rows[tri, None]) & \
+                (b0 >= -1e-9) & (b1 >= -1e-9) & (b2 >= -1e-9)
+
+            # 1/z is linear in screen space, so it interpolates exactly
+            z: NDArray = b0 * ooz[0, tri, None] + b1 * ooz[1, tri, None] + b2 * ooz[2, tri, None]
+
+            cells.append((py * width + px)[inside])
+            depth.append(z[inside])
+            shade.append(np.broadcast_to(glyphs[tri, None], inside.shape)[inside])
+
+        if not cells:
+            return np.empty(0, np.intp), np.empty(0), np.empty(0, np.uint8)
+        return np.concatenate(cells), np.concatenate(depth), np.concatenate(shade)
+
+
+def spin(
+    path: str,
+    ai: float = .04,
+    bi: float = .08,
+    speed: float = .03,
+    profile: bool = False,
+    profile_out: str | None = None,
+    trace: str | None = None
+) -> None:
+
+    '''Spins the model in `path` like the donut: `ai` and `bi` radians around
+    X and Y per frame, `speed` seconds between frames'''
+
+    engine: Mesh = Mesh(*load_obj(path))
+    profiler: Profiler | None = Profiler.from_options(('render', 'write'), profile, profile_out, trace)
+    timed = profiler if profiler is not None else untimed
+
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+    a, b = 0, 0
+    try:
+        while True:
+            width, height = os.get_terminal_size()
+            timed('write', echo_bytes, timed('render', engine.render_frame, a, b, width, height))
+            a += ai
+            b += bi
+
+            time.sleep(speed)
+
+    finally:
+        if profiler is not None:
+            profiler.finish()
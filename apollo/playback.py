@@ -0,0 +1,349 @@
+# playback.py
+# Threaded capture / render / output pipeline for terminal video
+
+from __future__ import annotations
+
+import cv2
+import queue
+import threading
+import time
+
+from collections import deque
+from cv2 import VideoCapture
+from numpy.typing import NDArray
+from typing import Any, Callable
+
+
+def put_latest(q: queue.Queue, item: Any) -> bool:
+    '''Puts `item` in `q`, discarding the stale items waiting there.
+    Returns True if something was dropped.'''
+    dropped: bool = False
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped = True
+            except queue.Empty:
+                pass
+
+
+class Pipeline:
+    '''`read` -> `render` -> `write`, each stage on its own thread.
+
+    The stages are connected by bounded queues. With `drop` set, a captured
+    frame still waiting to be rendered is replaced by the newest one, so a slow
+    terminal never makes capture fall behind a live source. Rendered frames are
+    never dropped: delta encoded output depends on every one of them.
+
+    `read` returns None at the end of the stream. `write` runs on the calling
+    thread, so Ctrl+C stops the pipeline like the end of the stream does.'''
+
+    def __init__(
+        self,
+        read: Callable[[], Any],
+        render: Callable[[Any], Any],
+        write: Callable[[Any], None],
+        depth: int = 2,
+        drop: bool = True
+    ) -> None:
+
+        self.read   = read
+        self.render = render
+        self.write  = write
+        self.drop   = drop
+
+        self.dropped: int = 0
+        self.error: Exception | None = None
+
+        self._frames:   queue.Queue = queue.Queue(maxsize=1)
+        self._rendered: queue.Queue = queue.Queue(maxsize=depth)
+        self._stop: threading.Event = threading.Event()
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=.1)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _capture(self) -> None:
+        try:
+            while not self._stop.is_set():
+                frame = self.read()
+                if frame is None: break
+
+                if self.drop:
+                    self.dropped += put_latest(self._frames, frame)
+                else:
+                    self._put(self._frames, frame)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self._frames, None)
+
+    def _render(self) -> None:
+        try:
+            while not self._stop.is_set():
+                frame = self._get(self._frames)
+                if frame is None: break
+                self._put(self._rendered, self.render(frame))
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self._rendered, None)
+
+    def run(self) -> None:
+        workers: list[threading.Thread] = [
+            threading.Thread(target=self._capture, name='apollo-capture', daemon=True),
+            threading.Thread(target=self._render,  name='apollo-render',  daemon=True),
+        ]
+        for worker in workers: worker.start()
+
+        try:
+            while True:
+                output = self._get(self._rendered)
+                if output is None: break
+                self.write(output)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            for worker in workers: worker.join()
+
+        if self.error is not None:
+            raise self.error
+
+
+def source_fps(cap: VideoCapture) -> float:
+    '''Frame rate a capture reports, 30 when the container does not say'''
+    fps: float = cap.get(cv2.CAP_PROP_FPS)
+    return fps if fps > 0 else 30.0
+
+
+class FrameClock:
+    '''When each frame of a `fps` source is due at `speed` times its rate.
+
+    Frame numbers count from `first`, which is due the moment `start` is
+    called. The players share it: `due` tells which frame to show now when
+    playback fell behind, `late` whether a frame missed its slot by a whole
+    frame, `wait` sleeps until a frame is due.'''
+
+    def __init__(self, fps: float, speed: float = 1.0, first: int = 0) -> None:
+        if speed <= 0:
+            raise ValueError('Playback speed must be positive.')
+
+        self.interval: float = 1 / (fps * speed)
+        self.first:    int   = first
+        self.origin:   float | None = None
+
+    def start(self) -> None:
+        self.origin = time.perf_counter() - self.first * self.interval
+
+    def due(self) -> int:
+        return int((time.perf_counter() - self.origin) / self.interval)
+
+    def late(self, frame: int) -> bool:
+        return time.perf_counter() - (self.origin + frame * self.interval) >= self.interval
+
+    def wait(self, frame: int) -> None:
+        wait: float = self.origin + frame * self.interval - time.perf_counter()
+        if wait > 0: time.sleep(wait)
+
+
+class PlaybackClock:
+    '''Paces a video file at its source frame rate, times `speed`.
+
+    `read` sleeps when playback is ahead of the wall clock and, when it is
+    behind, skips the late frames with `grab()` so they are never decoded.'''
+
+    def __init__(self, cap: VideoCapture, speed: float = 1.0, start: float = 0.0) -> None:
+        self.clock: FrameClock = FrameClock(source_fps(cap), speed)
+
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+
+        self.cap:      VideoCapture = cap
+        self.index:    int          = 0
+        self.skipped:  int          = 0
+
+    def read(self) -> NDArray | None:
+        if self.clock.origin is None:
+            # start the clock once the first frame is in, not while buffering
+            ret, frame = self.cap.read()
+            self.clock.start()
+            self.index = 1
+            return frame if ret else None
+
+        due: int = self.clock.due()
+        while self.index < due:
+            if not self.cap.grab(): return None
+            self.index   += 1
+            self.skipped += 1
+
+        self.clock.wait(self.index)
+
+        ret, frame = self.cap.read()
+        self.index += 1
+        return frame if ret else None
+
+
+class ReadAhead:
+    '''Decodes a capture on a background thread, `seconds` ahead of playback.
+
+    The first read blocks until that much is buffered, so playback of a
+    network stream starts once the buffer is full rather than once the whole
+    file arrived. Exposes the part of the `VideoCapture` interface playback
+    uses; `set` only has an effect before the first read.'''
+
+    def __init__(self, cap: VideoCapture, seconds: float) -> None:
+        self.cap:  VideoCapture = cap
+        self.size: int          = max(1, int(seconds * source_fps(cap)))
+
+        self._frames:  deque = deque()
+        self._cond:    threading.Condition = threading.Condition()
+        self._done:    bool = False
+        self._stopped: bool = False
+        self._primed:  bool = False
+        self._thread:  threading.Thread | None = None
+
+    def _fill(self) -> None:
+        while True:
+            with self._cond:
+                while len(self._frames) >= self.size and not self._stopped:
+                    self._cond.wait()
+                if self._stopped: return
+
+            ret, frame = self.cap.read()
+
+            with self._cond:
+                if not ret:
+                    self._done = True
+                    self._cond.notify_all()
+                    return
+                self._frames.append(frame)
+                self._cond.notify_all()
+
+    def read(self) -> tuple[bool, NDArray | None]:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._fill, name='apollo-read-ahead', daemon=True)
+            self._thread.start()
+
+        with self._cond:
+            need: int = 1 if self._primed else self.size
+            while len(self._frames) < need and not self._done:
+                self._cond.wait()
+            self._primed = True
+
+            if not self._frames: return False, None
+            frame: NDArray = self._frames.popleft()
+            self._cond.notify_all()
+
+        return True, frame
+
+    def grab(self) -> bool:
+        return self.read()[0]
+
+    def get(self, prop: int) -> float:
+        return self.cap.get(prop)
+
+    def set(self, prop: int, value: float) -> bool:
+        return self.cap.set(prop, value)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def release(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None: self._thread.join()
+        self.cap.release()
+
+
+class QualityController:
+    '''Holds a target frame rate by trading quality for time.
+
+    `update` takes the render + write time of every frame. When its moving
+    average stays over budget for `patience_down` frames quality drops one
+    level; when it stays under `headroom` of the budget for `patience_up`
+    frames it rises one. Falling right back after a rise doubles the wait
+    before the next rise, so quality settles instead of oscillating.'''
+
+    # (grid scale, color mode, reduced shade set)
+    LEVELS: tuple = (
+        (1.0,  'truecolor', False),
+        (.75,  'truecolor', False),
+        (.75,  '256',       False),
+        (.5,   '256',       False),
+        (.5,   '16',        False),
+        (.35,  '16',        True),
+        (.25,  'none',      True),
+    )
+
+    def __init__(
+        self,
+        target_fps: float,
+        levels: tuple = LEVELS,
+        headroom: float = .6,
+        patience_down: int = 5,
+        patience_up: int = 30
+    ) -> None:
+
+        self.budget:   float = 1 / target_fps
+        self.levels:   tuple = levels
+        self.headroom: float = headroom
+        self.patience_down: int = patience_down
+        self.patience_up:   int = patience_up
+
+        self.level: int = 0
+        self._ema:   float | None = None
+        self._over:  int = 0
+        self._under: int = 0
+        self._since_rise: int | None = None
+        self._wait_up: int = patience_up
+
+    @property
+    def quality(self) -> tuple:
+        return self.levels[self.level]
+
+    def _step(self, direction: int) -> None:
+        self.level += direction
+        self._ema, self._over, self._under = None, 0, 0
+
+    def update(self, elapsed: float) -> bool:
+        '''Returns True when the level changed'''
+        self._ema = elapsed if self._ema is None else .8 * self._ema + .2 * elapsed
+        if self._since_rise is not None: self._since_rise += 1
+
+        if self._ema > self.budget:
+            self._over, self._under = self._over + 1, 0
+        elif self._ema < self.headroom * self.budget:
+            self._over, self._under = 0, self._under + 1
+        else:
+            self._over = self._under = 0
+
+        if self._over >= self.patience_down and self.level < len(self.levels) - 1:
+            if self._since_rise is not None and self._since_rise < 2 * self._wait_up:
+                self._wait_up = min(self._wait_up * 2, 20 * self.patience_up)
+            self._since_rise = None
+            self._step(+1)
+            return True
+
+        if self._under >= self._wait_up and self.level > 0:
+            self._since_rise = 0
+            self._step(-1)
+            return True
+
+        return False
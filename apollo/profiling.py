@@ -0,0 +1,154 @@
+# profiling.py
+# Per stage frame timings for the players, with JSON and Chrome trace export
+
+from __future__ import annotations
+
+import json
+import numpy as np
+import threading
+import time
+
+from numpy.typing import NDArray
+from typing import Any, Callable, Sequence
+
+
+QUANTILES: tuple = (50, 95, 99)
+
+
+def untimed(stage: str, fn: Callable, *args: Any) -> Any:
+    '''Stand-in for a `Profiler` when profiling is off: one extra call'''
+    return fn(*args)
+
+
+class Profiler:
+    '''Records `perf_counter_ns` start and duration of every call of every
+    stage into arrays allocated up front.
+
+    Call it like `untimed`: `profiler('resize', fn, *args)`. Each stage keeps
+    the last `capacity` samples in a ring, stages may run on different
+    threads. `frame_stage` counts the frames for the FPS figure.'''
+
+    def __init__(
+        self,
+        stages: Sequence[str],
+        frame_stage: str = 'write',
+        capacity: int = 1 << 15,
+        json_path: str | None = None,
+        trace_path: str | None = None
+    ) -> None:
+
+        self.stages:      list[str] = list(stages)
+        self.frame_stage: str = frame_stage
+        self.capacity:    int = capacity
+        self.json_path:   str | None = json_path
+        self.trace_path:  str | None = trace_path
+
+        self.starts:    NDArray = np.zeros((len(self.stages), capacity), dtype=np.int64)
+        self.durations: NDArray = np.zeros((len(self.stages), capacity), dtype=np.int64)
+        self.counts:    list[int] = [0] * len(self.stages)
+        self.threads:   list[int] = [0] * len(self.stages)
+
+        self._index: dict[str, int] = {stage: i for i, stage in enumerate(self.stages)}
+        self.origin: int = time.perf_counter_ns()
+        self.end:    int | None = None
+
+    @classmethod
+    def from_options(
+        cls,
+        stages: Sequence[str],
+        profile: bool,
+        json_path: str | None = None,
+        trace_path: str | None = None
+    ) -> Profiler | None:
+        '''A profiler when any of the CLI options asks for one, else None'''
+        if not (profile or json_path or trace_path):
+            return None
+        return cls(stages, json_path=json_path, trace_path=trace_path)
+
+    def __call__(self, stage: str, fn: Callable, *args: Any) -> Any:
+        start: int = time.perf_counter_ns()
+        result: Any = fn(*args)
+        self.record(stage, start, time.perf_counter_ns())
+        return result
+
+    def record(self, stage: str, start: int, end: int) -> None:
+        i: int = self._index[stage]
+        n: int = self.counts[i]
+        if n == 0: self.threads[i] = threading.get_ident()
+
+        self.starts[i, n % self.capacity]    = start - self.origin
+        self.durations[i, n % self.capacity] = end - start
+        self.counts[i] = n + 1
+
+    def samples(self, stage: str) -> tuple[NDArray, NDArray]:
+        '''Start offsets and durations (ns) of the samples kept, oldest first'''
+        i: int = self._index[stage]
+        n: int = self.counts[i]
+        if n <= self.capacity:
+            return self.starts[i, :n], self.durations[i, :n]
+        order: NDArray = np.roll(np.arange(self.capacity), -(n % self.capacity))
+        return self.starts[i, order], self.durations[i, order]
+
+    def stop(self) -> None:
+        self.end = time.perf_counter_ns()
+
+    def summary(self) -> dict:
+        elapsed: float = ((self.end or time.perf_counter_ns()) - self.origin) / 1e9
+        frames: int = self.counts[self._index[self.frame_stage]]
+
+        stages: dict[str, dict] = {}
+        for stage in self.stages:
+            _, durations = self.samples(stage)
+            if durations.size == 0: continue
+            ms: NDArray = durations / 1e6
+            stages[stage] = {
+                'count': self.counts[self._index[stage]],
+                'mean_ms': float(ms.mean()),
+                **{f'p{q}_ms': float(v) for q, v in zip(QUANTILES, np.percentile(ms, QUANTILES))},
+                'max_ms': float(ms.max()),
+            }
+
+        return {'frames': frames, 'seconds': elapsed, 'fps': frames / elapsed if elapsed else 0.0, 'stages': stages}
+
+    def report(self) -> str:
+        summary: dict = self.summary()
+        lines: list[str] = [f'{"stage":<10} {"count":>7} {"mean":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}  (ms)']
+        for stage, s in summary['stages'].items():
+            lines.append(
+                f'{stage:<10} {s["count"]:>7} {s["mean_ms"]:>8.3f} {s["p50_ms"]:>8.3f} '
+                f'{s["p95_ms"]:>8.3f} {s["p99_ms"]:>8.3f} {s["max_ms"]:>8.3f}'
+            )
+        lines.append(f'{summary["frames"]} frames in {summary["seconds"]:.2f} s: {summary["fps"]:.1f} fps')
+        return '\n'.join(lines)
+
+    def save_json(self, path: str) -> None:
+        '''The summary plus every sample kept, in milliseconds'''
+        data: dict = self.summary()
+        data['samples'] = {}
+        for stage in self.stages:
+            starts, durations = self.samples(stage)
+            data['samples'][stage] = {'start_ms': (starts / 1e6).tolist(), 'duration_ms': (durations / 1e6).tolist()}
+
+        with open(path, 'w') as fh:
+            json.dump(data, fh)
+
+    def save_trace(self, path: str) -> None:
+        '''Chrome trace event format, for chrome://tracing or ui.perfetto.dev'''
+        events: list[dict] = []
+        for stage in self.stages:
+            tid: int = self.threads[self._index[stage]]
+            starts, durations = self.samples(stage)
+            events.extend(
+                {'name': stage, 'ph': 'X', 'pid': 1, 'tid': tid, 'ts': start / 1e3, 'dur': duration / 1e3}
+                for start, duration in zip(starts.tolist(), durations.tolist())
+            )
+
+        with open(path, 'w') as fh:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh)
+
+    def finish(self) -> None:
+        '''Prints the report and writes the files asked for'''
+        self.stop()
+        print(self.report())
+        if self.json_path:  self.save_json(self.json_path)
+        if self.trace_path: self.save_trace(self.trace_path)
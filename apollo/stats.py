@@ -0,0 +1,146 @@
+# stats.py
+# Single pass, constant memory statistics over streams of numbers
+
+from __future__ import annotations
+
+import numpy as np
+import sys
+
+from numpy.typing import NDArray
+from typing import BinaryIO, Dict, Iterable, Iterator, Sequence
+
+from .graph import parse_numbers
+
+
+class TDigest:
+    '''Merging t-digest: quantiles from a bounded set of weighted centroids.
+
+    Values are buffered as unit centroids and compressed, fully vectorized,
+    once there are `buffer` of them. Centroids stay small near the tails, so
+    extreme quantiles remain accurate; inputs up to `buffer` values long are
+    never compressed and give the exact quantiles of `np.quantile` (linear
+    interpolation). Once compressed, quantiles interpolate between centroid
+    midpoints.'''
+
+    def __init__(self, compression: int = 1000, buffer: int = 5000) -> None:
+        self.compression: int = compression
+        self.buffer: int = max(buffer, compression)
+        self.means:   NDArray = np.empty(0)
+        self.weights: NDArray = np.empty(0)
+        self.compressed: bool = False
+
+    def update(self, values: NDArray) -> None:
+        self.means   = np.concatenate((self.means, values))
+        self.weights = np.concatenate((self.weights, np.ones(values.size)))
+        if self.means.size > self.buffer:
+            self._compress()
+
+    def _sort(self) -> None:
+        order: NDArray = np.argsort(self.means, kind='stable')
+        self.means, self.weights = self.means[order], self.weights[order]
+
+    def _compress(self) -> None:
+        self._sort()
+        cumulative: NDArray = np.cumsum(self.weights)
+        q: NDArray = (cumulative - self.weights / 2) / cumulative[-1]
+
+        # k1 scale function, a centroid spans at most one unit of k
+        k: NDArray = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        group: NDArray = np.floor(k - k[0]).astype(np.int64)
+        starts: NDArray = np.concatenate(([0], np.flatnonzero(np.diff(group)) + 1))
+
+        weights: NDArray = np.add.reduceat(self.weights, starts)
+        self.means   = np.add.reduceat(self.means * self.weights, starts) / weights
+        self.weights = weights
+        self.compressed = True
+
+    def quantile(self, q: float | NDArray) -> float | NDArray:
+        if self.means.size == 0:
+            return np.nan
+        if not self.compressed:
+            return np.quantile(self.means, q)
+        self._sort()
+        centers: NDArray = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(np.asarray(q) * self.weights.sum(), centers, self.means)
+
+
+class StreamingStats:
+    '''Count, sum, min, max, mean/variance (Welford, merged per chunk) and
+    approximate quantiles of everything passed to `update`'''
+
+    def __init__(self, compression: int = 1000) -> None:
+        self.count:   int   = 0
+        self.total:   float = 0.0
+        self.minimum: float = np.inf
+        self.maximum: float = -np.inf
+        self.mean:    float = 0.0
+        self.m2:      float = 0.0
+        self.digest: TDigest = TDigest(compression)
+
+    def update(self, values: NDArray) -> None:
+        values = values[~np.isnan(values)]
+        n: int = values.size
+        if n == 0: return
+
+        chunk_mean: float = float(values.mean())
+        chunk_m2:   float = float(((values - chunk_mean) ** 2).sum())
+
+        # Chan et al. merge of two (count, mean, M2) summaries
+        total: int = self.count + n
+        delta: float = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2   += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        self.total  += float(values.sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.digest.update(values)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else np.nan
+
+    def summary(self, quantiles: Sequence[float] = (.5,)) -> Dict[str, float]:
+        result: Dict[str, float] = {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.minimum if self.count else np.nan,
+            'max': self.maximum if self.count else np.nan,
+            'mean': self.mean if self.count else np.nan,
+            'std': float(np.sqrt(self.variance)),
+        }
+        for q in quantiles:
+            result['median' if q == .5 else f'p{q * 100:g}'] = float(self.digest.quantile(q))
+        return result
+
+
+def read_chunks(fh: BinaryIO, chunk_size: int = 1 << 22) -> Iterator[NDArray]:
+    '''Numbers of a text stream, parsed `chunk_size` bytes at a time'''
+    tail: bytes = b''
+    while chunk := fh.read(chunk_size):
+        data: bytes = tail + chunk
+        # do not split a number across two chunks
+        cut: int = max(data.rfind(b'\n'), data.rfind(b' '), data.rfind(b','), data.rfind(b'\t'))
+        if cut < 0:
+            tail = data
+            continue
+        tail = data[cut + 1:]
+        yield parse_numbers([data[:cut + 1]])
+    if tail:
+        yield parse_numbers([tail])
+
+
+def summarize(paths: Iterable[str], quantiles: Sequence[float] = (.5,)) -> Dict[str, float]:
+    '''Statistics of all the numbers in `paths` (stdin when empty or `-`)'''
+    stats: StreamingStats = StreamingStats()
+
+    for path in list(paths) or ['-']:
+        fh: BinaryIO = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            for values in read_chunks(fh):
+                stats.update(values)
+        finally:
+            if fh is not sys.stdin.buffer: fh.close()
+
+    return stats.summary(quantiles)
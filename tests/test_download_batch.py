@@ -0,0 +1,78 @@
+# test_download_batch.py
+# download_batch against a stubbed backend: retries, file names, duplicate videos
+
+from __future__ import annotations
+
+import os
+import threading
+
+import pytest
+
+from apollo.cache import MediaCache
+from apollo.download import download_batch
+
+A: str = 'https://www.youtube.com/watch?v=aaaaaaaaaaa'
+B: str = 'https://www.youtube.com/watch?v=bbbbbbbbbbb'
+
+
+class StubBackend:
+    '''Appends one chunk to the partial file per call, raising OSError on the
+    first `failures[url]` calls, like a connection dropping mid download'''
+
+    def __init__(self, failures: dict[str, int] | None = None) -> None:
+        self.failures: dict[str, int] = dict(failures or {})
+        self.calls: dict[str, int] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def __call__(self, url: str, path: str, res: str, progress) -> None:
+        with self._lock:
+            self.calls[url] = n = self.calls.get(url, 0) + 1
+        with open(path, 'ab') as fh:
+            fh.write(f'{url} chunk {n}\n'.encode())
+        progress(n, None)
+        if n <= self.failures.get(url, 0):
+            raise OSError('connection reset')
+
+
+def batch(tmp_path, urls: list[str], backend: StubBackend, **kwargs) -> dict[str, str | None]:
+    # the media cache disabled, so every URL goes through the backend
+    return download_batch(urls, str(tmp_path), 'best', backend=backend, backoff=0,
+                          cache=MediaCache(str(tmp_path / 'cache'), limit=0), **kwargs)
+
+
+def test_retry_resumes_partial_file(tmp_path) -> None:
+    backend: StubBackend = StubBackend({A: 2})
+    results: dict = batch(tmp_path, [A], backend, retries=3)
+
+    assert backend.calls[A] == 3
+    with open(results[A], 'rb') as fh:
+        assert fh.read().count(b'chunk') == 3  # the partial file was kept between attempts
+    assert not any(name.startswith('.apollo-') for name in os.listdir(tmp_path))
+
+
+def test_gives_up_after_retries(tmp_path) -> None:
+    backend: StubBackend = StubBackend({A: 5})
+    results: dict = batch(tmp_path, [A, B], backend, retries=1)
+
+    assert backend.calls[A] == 2
+    assert results[A] is None
+    assert results[B] is not None
+
+
+def test_reserves_free_names(tmp_path) -> None:
+    (tmp_path / 'yt-download.mp4').write_bytes(b'already here')
+    results: dict = batch(tmp_path, [A, B], StubBackend(), jobs=2)
+
+    assert sorted(os.path.basename(path) for path in results.values()) == \
+        ['yt-download (copy 2).mp4', 'yt-download (copy).mp4']
+    assert (tmp_path / 'yt-download.mp4').read_bytes() == b'already here'
+
+
+@pytest.mark.parametrize('duplicate', [A, 'https://youtu.be/aaaaaaaaaaa'])
+def test_duplicate_videos_download_once(tmp_path, duplicate: str) -> None:
+    backend: StubBackend = StubBackend()
+    results: dict = batch(tmp_path, [A, duplicate, B], backend, jobs=3)
+
+    assert backend.calls == {A: 1, B: 1}
+    assert results[duplicate] == results[A]
+    assert len(set(results.values())) == 2
@@ -0,0 +1,66 @@
+# test_startup.py
+# Startup budget of the lightweight commands: no heavy imports, fast `import apollo.cli`
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY: tuple = ('numpy', 'cv2', 'yt_dlp', 'pytube')
+
+# cumulative import time of apollo.cli, generous enough for a loaded CI box
+IMPORT_BUDGET_US: int = 300_000
+
+# runs the CLI in process, then reports which heavy modules it pulled in
+PROBE: str = '''
+import json, sys
+from apollo.cli import main
+try:
+    main(sys.argv[1:], standalone_mode=False)
+except SystemExit:
+    pass
+print(json.dumps([m for m in {heavy!r} if m in sys.modules]), file=sys.stderr)
+'''
+
+
+def run(args: list[str], tmp_path, *flags: str) -> subprocess.CompletedProcess:
+    env: dict = dict(os.environ, PYTHONPATH=ROOT,
+                     XDG_CONFIG_HOME=str(tmp_path / 'config'), XDG_CACHE_HOME=str(tmp_path / 'cache'))
+    return subprocess.run(
+        [sys.executable, *flags, '-c', PROBE.format(heavy=HEAVY), *args],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True
+    )
+
+
+@pytest.mark.parametrize('args', [
+    ['config', '--show'],
+    ['countlines', ROOT],
+    ['countlines', ROOT, '--no-cache', '-j', '1'],
+])
+def test_light_commands_skip_heavy_imports(args: list[str], tmp_path) -> None:
+    result: subprocess.CompletedProcess = run(args, tmp_path)
+    assert json.loads(result.stderr.strip().splitlines()[-1]) == []
+
+
+def test_cli_import_budget(tmp_path) -> None:
+    env: dict = dict(os.environ, PYTHONPATH=ROOT)
+    result: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import apollo.cli'],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True
+    )
+
+    # `import time: self [us] | cumulative | imported package`
+    cumulative: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        _, total, name = line.split(':', 1)[1].split('|')
+        cumulative[name.strip()] = int(total)
+
+    assert not set(HEAVY) & set(cumulative)
+    assert cumulative['apollo.cli'] < IMPORT_BUDGET_US